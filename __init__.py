@@ -22,7 +22,6 @@ from . import properties
 from . import operators
 from . import ui_panel
 from . import utils
-from . import renderer
 
 
 # Registration
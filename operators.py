@@ -2,14 +2,66 @@
 Operators for CCABN Dataset Generator
 """
 
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
 import bpy
 from bpy.types import Operator
 from .utils import (
     convert_blendshapes_arkit_to_unified,
     validate_scene_setup,
     refresh_blendshape_list,
+    resolve_output_dir,
+    get_shard_range,
+    get_metadata_filename,
+    get_stop_path,
+    clear_metadata,
+    merge_metadata,
+    acquire_output_lock,
+    release_output_lock,
+    release_worker_locks,
 )
-from .renderer import render_dataset
+
+
+_refresh_pending = False
+
+
+def _deferred_refresh():
+    """Timer callback running a scheduled blendshape list refresh"""
+    global _refresh_pending
+    _refresh_pending = False
+    refresh_blendshape_list(bpy.context)
+    return None
+
+
+def _schedule_refresh(context):
+    """Refresh the blendshape list once after a burst of face/shape key edits"""
+    global _refresh_pending
+
+    # Timers don't run without an event loop, so refresh right away
+    if bpy.app.background:
+        refresh_blendshape_list(context)
+        return
+
+    if not _refresh_pending:
+        _refresh_pending = True
+        bpy.app.timers.register(_deferred_refresh, first_interval=0.05)
+
+
+def _object_pointers(collection):
+    """Get the set of object pointers referenced by an ObjectItem collection"""
+    return {item.obj.as_pointer() for item in collection if item.obj}
+
+
+def _swap_remove(collection, index):
+    """Remove an ObjectItem by overwriting it with the last item, avoiding a shift"""
+    last = len(collection) - 1
+    if index != last:
+        collection[index].obj = collection[last].obj
+    collection.remove(last)
 
 
 class CCABN_OT_ConvertBlendshapes(Operator):
@@ -25,30 +77,34 @@ class CCABN_OT_ConvertBlendshapes(Operator):
             self.report({'ERROR'}, "No human faces selected")
             return {'CANCELLED'}
 
+        human_faces = props.human_faces
         total_renamed = 0
         report_lines = []
 
-        for item in props.human_faces:
-            if not item.obj:
+        for item in human_faces:
+            obj = item.obj
+            if not obj:
                 continue
 
-            num_renamed, renamed_list = convert_blendshapes_arkit_to_unified(item.obj)
+            num_renamed, renamed_list = convert_blendshapes_arkit_to_unified(obj)
             total_renamed += num_renamed
 
-            if num_renamed > 0:
-                report_lines.append(f"{item.obj.name}: {num_renamed} blendshapes renamed")
-                print(f"\n=== {item.obj.name} ===")
-                for old_name, new_name in renamed_list:
-                    print(f"  {old_name} → {new_name}")
+            if num_renamed > 0 and props.verbose_logging:
+                report_lines.append(f"\n=== {obj.name} ===")
+                report_lines.extend(f"  {old_name} → {new_name}" for old_name, new_name in renamed_list)
+
+        # Write the rename log in one go instead of a print per blendshape
+        if report_lines:
+            sys.stdout.write("\n".join(report_lines) + "\n")
 
         if total_renamed == 0:
             self.report({'WARNING'}, "No ARKit blendshapes found to convert")
         else:
-            self.report({'INFO'}, f"Converted {total_renamed} blendshapes across {len(props.human_faces)} objects")
+            self.report({'INFO'}, f"Converted {total_renamed} blendshapes across {len(human_faces)} objects")
             print(f"\n✓ Total: {total_renamed} blendshapes converted")
 
             # Refresh blendshape list to show new names
-            refresh_blendshape_list(context)
+            _schedule_refresh(context)
 
         return {'FINISHED'}
 
@@ -60,12 +116,16 @@ class CCABN_OT_RefreshBlendshapes(Operator):
     bl_options = {'REGISTER'}
 
     def execute(self, context):
-        refresh_blendshape_list(context)
+        refreshed = refresh_blendshape_list(context)
+
         props = context.scene.ccabn_props
 
         num_shapes = len(props.blendshape_list)
         if num_shapes == 0:
             self.report({'WARNING'}, "No blendshapes found on selected human faces")
+        elif not refreshed:
+            self.report({'INFO'}, "Blendshape list is already up to date")
+            return {'CANCELLED'}
         else:
             self.report({'INFO'}, f"Found {num_shapes} unique blendshapes")
 
@@ -79,26 +139,108 @@ class CCABN_OT_GenerateDataset(Operator):
     bl_options = {'REGISTER'}
 
     _timer = None
-    _rendering = False
+    _job = None
+    _rendered = 0
+    _processes = None
+    _temp_dir = None
+    _output_dir = None
+    _lock_path = None
+    _stopping = False
+    _props = None
 
     def modal(self, context, event):
-        if event.type == 'TIMER':
-            if not self._rendering:
-                return {'FINISHED'}
+        if event.type == 'ESC':
+            # Workers stop after their current image and save their
+            # metadata, a second Esc terminates them right away
+            if self._processes and not self._stopping and self._request_stop():
+                return {'RUNNING_MODAL'}
+
+            self._cancel(context)
+            self.report({'WARNING'}, "Dataset generation cancelled")
+            return {'CANCELLED'}
 
-        return {'PASS_THROUGH'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        # In-process job: render one image per timer tick
+        if self._job is not None:
+            return self._step_job(context)
+
+        # Background workers: wait until all of them have exited
+        if any(proc.poll() is None for proc in self._processes):
+            return {'PASS_THROUGH'}
+
+        self._cleanup_workers(context)
+        if self._stopping:
+            self.report({'WARNING'}, "Dataset generation cancelled")
+            return {'CANCELLED'}
+
+        self._report_workers()
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        # Interactive runs are driven from a modal timer so the UI stays responsive
+        return self._run(context, interactive=True)
 
     def execute(self, context):
+        return self._run(context, interactive=False)
+
+    def _run(self, context, interactive):
+        """Validate the setup and start rendering in the requested mode"""
+        # Imported on first use so registering the add-on doesn't load NumPy
+        from .renderer import render_dataset, iter_render_dataset
+
         props = context.scene.ccabn_props
 
+        # The job's scene, in case the user switches scenes while it runs
+        self._props = props
+
         # Validate setup
         is_valid, error_msg = validate_scene_setup(props)
         if not is_valid:
             self.report({'ERROR'}, f"Invalid setup: {error_msg}")
             return {'CANCELLED'}
 
-        # Confirm with user
         total_images = len(props.human_faces) * props.images_per_human
+
+        output_dir = str(resolve_output_dir(props.output_path))
+
+        # Worker process launched by an interactive run: render only this shard
+        if props.shard_total > 0:
+            start, end = get_shard_range(total_images, props.shard_index, props.shard_total)
+            print(f"CCABN shard {props.shard_index + 1}/{props.shard_total}: images {start + 1}-{end}")
+
+            lock_path, error_msg = acquire_output_lock(output_dir, props.shard_index, start, end)
+            if lock_path is None:
+                self.report({'ERROR'}, error_msg)
+                return {'CANCELLED'}
+
+            try:
+                success, message = render_dataset(
+                    context, props, start, end, get_metadata_filename(props.shard_index),
+                    get_stop_path(output_dir)
+                )
+            finally:
+                release_output_lock(lock_path)
+
+            self._report_result(success, message)
+            return {'FINISHED'} if success else {'CANCELLED'}
+
+        self._lock_path, error_msg = acquire_output_lock(output_dir, None, 0, total_images)
+        if self._lock_path is None:
+            self.report({'ERROR'}, error_msg)
+            return {'CANCELLED'}
+
+        # The new images replace the old ones, so drop their metadata
+        try:
+            clear_metadata(output_dir)
+        except OSError as e:
+            self._release_lock()
+            self.report({'ERROR'}, f"Cannot remove previous metadata: {str(e)}")
+            return {'CANCELLED'}
+
+        # Confirm with user
+        num_shards = min(props.images_shards, total_images)
         print(f"\n{'='*60}")
         print(f"CCABN Dataset Generation Starting")
         print(f"{'='*60}")
@@ -107,17 +249,222 @@ class CCABN_OT_GenerateDataset(Operator):
         print(f"Total images: {total_images}")
         print(f"Output: {props.output_path}")
         print(f"Render engine: {props.render_engine}")
+        print(f"Parallel workers: {num_shards}")
         print(f"{'='*60}\n")
 
+        if num_shards > 1:
+            return self._launch_workers(context, props, output_dir, num_shards, interactive)
+
+        if interactive and context.window is not None:
+            self._job = iter_render_dataset(context, props)
+            self._rendered = 0
+
+            # Run the job setup now, while this call's context is valid
+            try:
+                next(self._job)
+            except Exception as e:
+                self._job = None
+                self._release_lock()
+                self.report({'ERROR'}, f"Error during rendering: {str(e)}")
+                return {'CANCELLED'}
+
+            props.is_rendering = True
+            self._add_timer(context, 0.01)
+
+            self.report({'INFO'}, "Rendering dataset (Esc to cancel)")
+            return {'RUNNING_MODAL'}
+
         # Set rendering flag
         props.is_rendering = True
 
         # Run rendering
-        success, message = render_dataset(context, props)
+        try:
+            success, message = render_dataset(context, props)
+        finally:
+            self._release_lock()
 
         # Clear rendering flag
         props.is_rendering = False
 
+        self._report_result(success, message)
+
+        return {'FINISHED'}
+
+    def _add_timer(self, context, interval):
+        """Start polling from the window manager event loop"""
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(interval, window=context.window)
+        wm.modal_handler_add(self)
+
+    def _remove_timer(self, context):
+        """Stop polling from the window manager event loop"""
+        if self._timer:
+            context.window_manager.event_timer_remove(self._timer)
+            self._timer = None
+
+    def _release_lock(self):
+        """Release the output folder lock held by the main job"""
+        if self._lock_path:
+            release_output_lock(self._lock_path)
+            self._lock_path = None
+
+    def _step_job(self, context):
+        """Render the next image of the in-process job"""
+        try:
+            self._rendered, _ = next(self._job)
+        except StopIteration:
+            self._finish_job(context)
+            self._report_result(True, f"Successfully generated {self._rendered} images")
+            return {'FINISHED'}
+        except Exception as e:
+            self._finish_job(context)
+            self._report_result(False, f"Error during rendering: {str(e)}. Saved {self._rendered} images before failure.")
+            return {'CANCELLED'}
+
+        return {'PASS_THROUGH'}
+
+    def _finish_job(self, context):
+        """Close the in-process job, restoring the scene"""
+        self._remove_timer(context)
+        self._job.close()
+        self._job = None
+        self._release_lock()
+        self._props.is_rendering = False
+
+    def _cancel(self, context):
+        """Stop the running job or terminate all worker processes"""
+        if self._job is not None:
+            self._finish_job(context)
+            return
+
+        for proc in self._processes:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self._processes:
+            proc.wait()
+        self._cleanup_workers(context)
+
+    def _request_stop(self):
+        """Ask all workers to stop after the image they are rendering"""
+        try:
+            with open(get_stop_path(self._output_dir), 'w'):
+                pass
+        except OSError:
+            return False
+
+        self._stopping = True
+        self.report({'INFO'}, "Stopping workers after their current image (Esc again to abort)")
+        return True
+
+    def _remove_stop_file(self):
+        """Remove the stop request left for worker processes"""
+        try:
+            os.remove(get_stop_path(self._output_dir))
+        except FileNotFoundError:
+            pass
+
+    def _launch_workers(self, context, props, output_dir, num_shards, interactive):
+        """Save a copy of the scene and render it in background Blender processes"""
+        self._output_dir = output_dir
+        self._remove_stop_file()
+        self._temp_dir = tempfile.mkdtemp(prefix="ccabn_")
+        blend_path = os.path.join(self._temp_dir, "ccabn_dataset.blend")
+
+        try:
+            bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+        except RuntimeError as e:
+            self._cleanup_workers(context)
+            self.report({'ERROR'}, f"Cannot save scene copy for workers: {str(e)}")
+            return {'CANCELLED'}
+
+        gpu_env_var, num_gpus = self._get_worker_gpus(context, props)
+        if num_gpus > 1:
+            print(f"Spreading workers over {num_gpus} GPUs")
+
+        self._processes = []
+        for shard_index in range(num_shards):
+            # Workers load the copy from a temp folder, so pass an absolute output path
+            expr = (
+                "import sys, bpy; "
+                "p = bpy.context.scene.ccabn_props; "
+                f"p.output_path = {output_dir!r}; "
+                f"p.shard_index = {shard_index}; "
+                f"p.shard_total = {num_shards}; "
+                "sys.exit(0 if 'FINISHED' in bpy.ops.ccabn.generate_dataset() else 1)"
+            )
+
+            # Pin each worker to one GPU so they don't all compete for the first
+            env = None
+            if num_gpus > 1:
+                env = dict(os.environ)
+                env[gpu_env_var] = str(shard_index % num_gpus)
+
+            self._processes.append(subprocess.Popen([
+                bpy.app.binary_path,
+                "-b", blend_path,
+                "--python-exit-code", "1",
+                "--python-expr", expr,
+            ], env=env))
+
+        props.is_rendering = True
+
+        # Without a window there is no event loop to poll from
+        if not interactive or context.window is None:
+            for proc in self._processes:
+                proc.wait()
+            self._cleanup_workers(context)
+            self._report_workers()
+            return {'FINISHED'}
+
+        self._add_timer(context, 0.5)
+
+        self.report({'INFO'}, f"Rendering with {num_shards} background workers (Esc to cancel)")
+        return {'RUNNING_MODAL'}
+
+    def _get_worker_gpus(self, context, props):
+        """Find the GPUs worker processes can be pinned to"""
+        from .renderer import select_gpu_backend, GPU_VISIBLE_DEVICES_ENV
+
+        if props.render_engine != 'CYCLES':
+            return None, 0
+
+        cprefs = context.preferences.addons['cycles'].preferences
+        device_type = select_gpu_backend(cprefs)
+        if device_type not in GPU_VISIBLE_DEVICES_ENV:
+            return None, 0
+
+        num_gpus = sum(1 for device in cprefs.devices if device.type == device_type)
+        return GPU_VISIBLE_DEVICES_ENV[device_type], num_gpus
+
+    def _cleanup_workers(self, context):
+        """Stop polling workers, merge their metadata and remove the temporary scene copy"""
+        self._remove_timer(context)
+
+        if self._processes:
+            try:
+                merge_metadata(self._output_dir, len(self._processes))
+            except (OSError, ValueError) as e:
+                self.report({'ERROR'}, f"Cannot merge worker metadata: {str(e)}")
+
+            # All workers have exited here, including terminated ones
+            release_worker_locks(self._output_dir, len(self._processes))
+            self._remove_stop_file()
+
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
+        self._release_lock()
+        self._props.is_rendering = False
+
+    def _report_workers(self):
+        """Report the combined result of all worker processes"""
+        failed = [str(i + 1) for i, proc in enumerate(self._processes) if proc.returncode != 0]
+
+        if failed:
+            self._report_result(False, f"Worker(s) {', '.join(failed)} of {len(self._processes)} failed, see console for details")
+        else:
+            self._report_result(True, f"All {len(self._processes)} workers finished successfully")
+
+    def _report_result(self, success, message):
+        """Report and print the outcome of a rendering run"""
         if success:
             self.report({'INFO'}, message)
             print(f"\n{'='*60}")
@@ -129,8 +476,6 @@ class CCABN_OT_GenerateDataset(Operator):
             print(f"✗ {message}")
             print(f"{'='*60}\n")
 
-        return {'FINISHED'}
-
 
 class CCABN_OT_SelectAllBlendshapes(Operator):
     """Select all blendshapes in the list"""
@@ -141,10 +486,10 @@ class CCABN_OT_SelectAllBlendshapes(Operator):
     def execute(self, context):
         props = context.scene.ccabn_props
 
-        for item in props.blendshape_list:
-            item.selected = True
+        num_shapes = len(props.blendshape_list)
+        props.blendshape_list.foreach_set("selected", [True] * num_shapes)
 
-        self.report({'INFO'}, f"Selected all {len(props.blendshape_list)} blendshapes")
+        self.report({'INFO'}, f"Selected all {num_shapes} blendshapes")
         return {'FINISHED'}
 
 
@@ -157,21 +502,30 @@ class CCABN_OT_DeselectAllBlendshapes(Operator):
     def execute(self, context):
         props = context.scene.ccabn_props
 
-        for item in props.blendshape_list:
-            item.selected = False
+        num_shapes = len(props.blendshape_list)
+        props.blendshape_list.foreach_set("selected", [False] * num_shapes)
 
         self.report({'INFO'}, "Deselected all blendshapes")
         return {'FINISHED'}
 
 
-class CCABN_OT_AddLight(Operator):
-    """Add selected object as a light to randomize"""
-    bl_idname = "ccabn.add_light"
-    bl_label = "Add Light"
-    bl_options = {'REGISTER', 'UNDO'}
+# Object lists edited with Add/Remove buttons:
+# (collection, class name, operator id, label, object type, type name,
+#  add tooltip, refreshes blendshapes)
+_OBJECT_LISTS = (
+    ("lights", "Light", "light", "light", 'LIGHT', "light",
+     "Add selected object as a light to randomize", False),
+    ("human_faces", "HumanFace", "human_face", "human face", 'MESH', "mesh",
+     "Add selected object as a human face", True),
+)
+
+
+def _make_add_operator(attr, class_name, op_id, label, obj_type, type_name, description):
+    """Create an operator adding the active object to an ObjectItem collection"""
 
     def execute(self, context):
         props = context.scene.ccabn_props
+        collection = getattr(props, attr)
 
         if not context.active_object:
             self.report({'ERROR'}, "No active object selected")
@@ -179,101 +533,124 @@ class CCABN_OT_AddLight(Operator):
 
         obj = context.active_object
 
-        # Check if it's a light
-        if obj.type != 'LIGHT':
-            self.report({'ERROR'}, f"'{obj.name}' is not a light object")
+        # Check the object type
+        if obj.type != obj_type:
+            self.report({'ERROR'}, f"'{obj.name}' is not a {type_name} object")
             return {'CANCELLED'}
 
         # Check if already in list
-        for item in props.lights:
-            if item.obj == obj:
-                self.report({'WARNING'}, f"Light '{obj.name}' already in list")
-                return {'CANCELLED'}
+        if obj.as_pointer() in _object_pointers(collection):
+            self.report({'WARNING'}, f"{type_name.capitalize()} '{obj.name}' already in list")
+            return {'CANCELLED'}
 
         # Add to list
-        item = props.lights.add()
+        item = collection.add()
         item.obj = obj
 
-        self.report({'INFO'}, f"Added light: {obj.name}")
+        self.report({'INFO'}, f"Added {label}: {obj.name}")
         return {'FINISHED'}
 
+    return type(f"CCABN_OT_Add{class_name}", (Operator,), {
+        "__doc__": description,
+        "bl_idname": f"ccabn.add_{op_id}",
+        "bl_label": f"Add {label.title()}",
+        "bl_options": {'REGISTER', 'UNDO'},
+        "execute": execute,
+    })
 
-class CCABN_OT_RemoveLight(Operator):
-    """Remove light from the list"""
-    bl_idname = "ccabn.remove_light"
-    bl_label = "Remove Light"
-    bl_options = {'REGISTER', 'UNDO'}
+
+def _make_remove_operator(attr, class_name, op_id, label, refresh_blendshapes):
+    """Create an operator removing the active item from an ObjectItem collection"""
+    index_attr = f"{attr}_index"
 
     def execute(self, context):
         props = context.scene.ccabn_props
+        collection = getattr(props, attr)
+        index = getattr(props, index_attr)
+
+        if index >= 0 and index < len(collection):
+            obj_name = collection[index].obj.name if collection[index].obj else "Unknown"
+            _swap_remove(collection, index)
+            setattr(props, index_attr, min(index, max(0, len(collection) - 1)))
+            self.report({'INFO'}, f"Removed {label}: {obj_name}")
 
-        if props.lights_index >= 0 and props.lights_index < len(props.lights):
-            obj_name = props.lights[props.lights_index].obj.name if props.lights[props.lights_index].obj else "Unknown"
-            props.lights.remove(props.lights_index)
-            props.lights_index = max(0, props.lights_index - 1)
-            self.report({'INFO'}, f"Removed light: {obj_name}")
+            if refresh_blendshapes:
+                _schedule_refresh(context)
         else:
-            self.report({'ERROR'}, "No light selected to remove")
+            self.report({'ERROR'}, f"No {label} selected to remove")
             return {'CANCELLED'}
 
         return {'FINISHED'}
 
+    return type(f"CCABN_OT_Remove{class_name}", (Operator,), {
+        "__doc__": f"Remove {label} from the list",
+        "bl_idname": f"ccabn.remove_{op_id}",
+        "bl_label": f"Remove {label.title()}",
+        "bl_options": {'REGISTER', 'UNDO'},
+        "execute": execute,
+    })
+
+
+_object_list_classes = tuple(
+    cls
+    for attr, class_name, op_id, label, obj_type, type_name, description, refresh_blendshapes in _OBJECT_LISTS
+    for cls in (
+        _make_add_operator(attr, class_name, op_id, label, obj_type, type_name, description),
+        _make_remove_operator(attr, class_name, op_id, label, refresh_blendshapes),
+    )
+)
+
 
-class CCABN_OT_AddHumanFace(Operator):
-    """Add selected object as a human face"""
-    bl_idname = "ccabn.add_human_face"
-    bl_label = "Add Human Face"
+class CCABN_OT_AddSelectedHumanFaces(Operator):
+    """Add all selected mesh objects as human faces"""
+    bl_idname = "ccabn.add_selected_human_faces"
+    bl_label = "Add Selected Human Faces"
     bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
         props = context.scene.ccabn_props
 
-        if not context.active_object:
-            self.report({'ERROR'}, "No active object selected")
-            return {'CANCELLED'}
+        # Build the lookup once so each selected object is an O(1) check
+        existing = _object_pointers(props.human_faces)
+        num_added = 0
 
-        obj = context.active_object
-
-        # Check if it's a mesh
-        if obj.type != 'MESH':
-            self.report({'ERROR'}, f"'{obj.name}' is not a mesh object")
-            return {'CANCELLED'}
+        for obj in context.selected_objects:
+            if obj.type != 'MESH' or obj.as_pointer() in existing:
+                continue
 
-        # Check if already in list
-        for item in props.human_faces:
-            if item.obj == obj:
-                self.report({'WARNING'}, f"Mesh '{obj.name}' already in list")
-                return {'CANCELLED'}
+            item = props.human_faces.add()
+            item.obj = obj
+            existing.add(obj.as_pointer())
+            num_added += 1
 
-        # Add to list
-        item = props.human_faces.add()
-        item.obj = obj
+        if num_added == 0:
+            self.report({'WARNING'}, "No new mesh objects selected")
+            return {'CANCELLED'}
 
-        self.report({'INFO'}, f"Added human face: {obj.name}")
+        self.report({'INFO'}, f"Added {num_added} human faces")
         return {'FINISHED'}
 
 
-class CCABN_OT_RemoveHumanFace(Operator):
-    """Remove human face from the list"""
-    bl_idname = "ccabn.remove_human_face"
-    bl_label = "Remove Human Face"
+class CCABN_OT_ClearHumanFaces(Operator):
+    """Remove all human faces from the list"""
+    bl_idname = "ccabn.clear_human_faces"
+    bl_label = "Clear Human Faces"
     bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
         props = context.scene.ccabn_props
 
-        if props.human_faces_index >= 0 and props.human_faces_index < len(props.human_faces):
-            obj_name = props.human_faces[props.human_faces_index].obj.name if props.human_faces[props.human_faces_index].obj else "Unknown"
-            props.human_faces.remove(props.human_faces_index)
-            props.human_faces_index = max(0, props.human_faces_index - 1)
-            self.report({'INFO'}, f"Removed human face: {obj_name}")
-
-            # Refresh blendshape list
-            refresh_blendshape_list(context)
-        else:
-            self.report({'ERROR'}, "No human face selected to remove")
+        if len(props.human_faces) == 0:
+            self.report({'WARNING'}, "Human face list is already empty")
             return {'CANCELLED'}
 
+        props.human_faces.clear()
+        props.human_faces_index = 0
+
+        # Refresh blendshape list
+        _schedule_refresh(context)
+
+        self.report({'INFO'}, "Cleared human faces")
         return {'FINISHED'}
 
 
@@ -284,11 +661,11 @@ classes = (
     CCABN_OT_GenerateDataset,
     CCABN_OT_SelectAllBlendshapes,
     CCABN_OT_DeselectAllBlendshapes,
-    CCABN_OT_AddLight,
-    CCABN_OT_RemoveLight,
-    CCABN_OT_AddHumanFace,
-    CCABN_OT_RemoveHumanFace,
+    *_object_list_classes,
+    CCABN_OT_AddSelectedHumanFaces,
+    CCABN_OT_ClearHumanFaces,
 )
+_classes_rev = classes[::-1]
 
 
 def register():
@@ -297,5 +674,11 @@ def register():
 
 
 def unregister():
-    for cls in reversed(classes):
+    global _refresh_pending
+
+    if bpy.app.timers.is_registered(_deferred_refresh):
+        bpy.app.timers.unregister(_deferred_refresh)
+    _refresh_pending = False
+
+    for cls in _classes_rev:
         bpy.utils.unregister_class(cls)
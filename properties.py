@@ -9,10 +9,14 @@ from bpy.props import (
     StringProperty,
     IntProperty,
     FloatProperty,
+    FloatVectorProperty,
     BoolProperty,
     EnumProperty,
 )
 from bpy.types import PropertyGroup
+from bpy.app.handlers import persistent
+
+from .utils import clear_output_dir_cache
 
 
 class ObjectItem(PropertyGroup):
@@ -35,19 +39,13 @@ class BlendshapeItem(PropertyGroup):
         default=False,
         description="Include this blendshape in randomization"
     )
-    min_value: FloatProperty(
-        name="Min",
-        default=0.0,
-        min=0.0,
-        max=1.0,
-        description="Minimum random value for this blendshape"
-    )
-    max_value: FloatProperty(
-        name="Max",
-        default=1.0,
+    range_values: FloatVectorProperty(
+        name="Range",
+        size=2,
+        default=(0.0, 1.0),
         min=0.0,
         max=1.0,
-        description="Maximum random value for this blendshape"
+        description="Minimum and maximum random value for this blendshape"
     )
 
 
@@ -239,7 +237,8 @@ class CCABNProperties(PropertyGroup):
         name="Output Folder",
         description="Folder to save rendered images and metadata",
         subtype='DIR_PATH',
-        default=""
+        default="",
+        update=clear_output_dir_cache
     )
 
     images_per_human: IntProperty(
@@ -259,7 +258,57 @@ class CCABNProperties(PropertyGroup):
         description="Render engine to use for image generation"
     )
 
+    cycles_samples: IntProperty(
+        name="Samples",
+        default=32,
+        min=1,
+        max=4096,
+        description="Maximum Cycles samples per image; adaptive sampling stops earlier once noise is low"
+    )
+
+    use_denoising: BoolProperty(
+        name="Denoise",
+        default=True,
+        description="Denoise Cycles renders with OpenImageDenoise"
+    )
+
+    master_seed: IntProperty(
+        name="Seed",
+        default=0,
+        min=0,
+        description="Master random seed; every image derives its own seed from it, so datasets are reproducible"
+    )
+
+    images_shards: IntProperty(
+        name="Parallel Workers",
+        default=1,
+        min=1,
+        description="Number of background Blender processes to split rendering across. Raise it for several GPUs or CPU rendering"
+    )
+
+    verbose_logging: BoolProperty(
+        name="Verbose Console Output",
+        default=True,
+        description="Print every renamed blendshape to the system console when converting from ARKit"
+    )
+
     # Runtime state
+    shard_index: IntProperty(
+        name="Shard Index",
+        default=0,
+        min=0,
+        options={'HIDDEN'},
+        description="Index of the image range rendered by this worker process"
+    )
+
+    shard_total: IntProperty(
+        name="Shard Total",
+        default=0,
+        min=0,
+        options={'HIDDEN'},
+        description="Number of worker processes (0 for an interactive run)"
+    )
+
     is_rendering: BoolProperty(
         name="Is Rendering",
         default=False,
@@ -267,12 +316,20 @@ class CCABNProperties(PropertyGroup):
     )
 
 
+@persistent
+def clear_rendering_flag(*args):
+    """Reset the rendering flag of files saved while a job was running"""
+    for scene in bpy.data.scenes:
+        scene.ccabn_props.is_rendering = False
+
+
 # Registration
 classes = (
     ObjectItem,
     BlendshapeItem,
     CCABNProperties,
 )
+_classes_rev = classes[::-1]
 
 
 def register():
@@ -281,9 +338,13 @@ def register():
 
     bpy.types.Scene.ccabn_props = PointerProperty(type=CCABNProperties)
 
+    bpy.app.handlers.load_post.append(clear_rendering_flag)
+
 
 def unregister():
+    bpy.app.handlers.load_post.remove(clear_rendering_flag)
+
     del bpy.types.Scene.ccabn_props
 
-    for cls in reversed(classes):
+    for cls in _classes_rev:
         bpy.utils.unregister_class(cls)
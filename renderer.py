@@ -4,17 +4,30 @@ Core rendering logic for CCABN Dataset Generator
 
 import bpy
 import os
-import random
 import math
-import json
-from pathlib import Path
+import numpy as np
 from mathutils import Vector, Euler
 
+from .utils import METADATA_FILENAME, get_blendshape_selection, resolve_output_dir, write_metadata
 
-def kelvin_to_rgb(kelvin):
+# Multiplier spreading master seeds apart in the per-image seed space
+SEED_PRIME = 1000003
+
+# Cycles GPU backends, in order of preference
+GPU_COMPUTE_DEVICE_TYPES = ('OPTIX', 'CUDA', 'HIP', 'ONEAPI', 'METAL')
+
+# Environment variables restricting a process to some GPUs, per backend
+GPU_VISIBLE_DEVICES_ENV = {
+    'OPTIX': 'CUDA_VISIBLE_DEVICES',
+    'CUDA': 'CUDA_VISIBLE_DEVICES',
+    'HIP': 'HIP_VISIBLE_DEVICES',
+}
+
+
+def _kelvin_to_rgb_exact(kelvin):
     """
     Convert color temperature in Kelvin to RGB values
-    Based on Tanner Helland's algorithm
+    Based on Tanner Helland's algorithm, used to build the lookup table
 
     Args:
         kelvin: Temperature in Kelvin (1000-40000)
@@ -54,9 +67,90 @@ def kelvin_to_rgb(kelvin):
     return (red / 255.0, green / 255.0, blue / 255.0)
 
 
-def setup_render_settings(context, props):
+# Kelvin to RGB lookup table in 100K steps (the algorithm's resolution), 1000K-40000K
+_KELVIN_LUT_MIN = 10
+_KELVIN_LUT_MAX = 400
+_KELVIN_LUT = np.array(
+    [_kelvin_to_rgb_exact(t * 100.0) for t in range(_KELVIN_LUT_MIN, _KELVIN_LUT_MAX + 1)],
+    dtype=np.float32
+)
+
+
+def kelvin_to_rgb(kelvin):
     """
-    Configure render settings for dataset generation
+    Convert color temperature in Kelvin to RGB values
+    Looks up the nearest 100K step of Tanner Helland's algorithm
+
+    Args:
+        kelvin: Temperature in Kelvin (1000-40000)
+
+    Returns:
+        Tuple of (r, g, b) values in range 0-1
+    """
+    bucket = max(_KELVIN_LUT_MIN, min(_KELVIN_LUT_MAX, int(round(kelvin / 100.0))))
+    r, g, b = _KELVIN_LUT[bucket - _KELVIN_LUT_MIN].tolist()
+    return (r, g, b)
+
+
+def kelvin_to_rgb_batch(kelvins):
+    """
+    Convert an array of color temperatures in Kelvin to RGB values
+    Vectorized kelvin_to_rgb, looking up all temperatures at once
+
+    Args:
+        kelvins: Array of temperatures in Kelvin (1000-40000)
+
+    Returns:
+        Array with an extra trailing axis of (r, g, b) values in range 0-1
+    """
+    buckets = np.clip(np.rint(np.asarray(kelvins) / 100.0), _KELVIN_LUT_MIN, _KELVIN_LUT_MAX)
+    return _KELVIN_LUT[buckets.astype(np.intp) - _KELVIN_LUT_MIN]
+
+
+def get_image_seed(master_seed, image_index):
+    """
+    Derive the random seed for a single image
+
+    Seeds depend only on the global image index, so a dataset is
+    reproducible regardless of how it is split across worker processes.
+
+    Args:
+        master_seed: Master seed from the CCABN properties
+        image_index: Global index of the image (0-based)
+
+    Returns:
+        Non-negative 31-bit integer seed
+    """
+    return (master_seed * SEED_PRIME + image_index) & 0x7FFFFFFF
+
+
+def select_gpu_backend(cprefs):
+    """
+    Select the preferred Cycles GPU backend that has a device present
+
+    Args:
+        cprefs: Cycles add-on preferences
+
+    Returns:
+        Name of the selected backend, or None if no GPU was found
+    """
+    for device_type in GPU_COMPUTE_DEVICE_TYPES:
+        try:
+            cprefs.compute_device_type = device_type
+        except TypeError:
+            # Backend not available in this Blender build
+            continue
+
+        cprefs.refresh_devices()
+        if any(device.type == device_type for device in cprefs.devices):
+            return device_type
+
+    return None
+
+
+def setup_render_engine(context, props):
+    """
+    Configure the render engine and devices once per job
 
     Args:
         context: Blender context
@@ -69,15 +163,46 @@ def setup_render_settings(context, props):
 
     # Configure Cycles if selected
     if props.render_engine == 'CYCLES':
-        scene.cycles.device = 'GPU'
-        # Use GPU devices
+        # Only shape keys, transforms and colors change between images, so
+        # keep the scene and BVH in memory instead of rebuilding them
+        scene.render.use_persistent_data = True
+        scene.cycles.debug_use_spatial_splits = False
+
+        # A 240x240 grayscale image converges with few samples
+        scene.cycles.samples = props.cycles_samples
+        scene.cycles.use_adaptive_sampling = True
+        scene.cycles.adaptive_threshold = 0.05
+        scene.cycles.use_denoising = props.use_denoising
+        if props.use_denoising:
+            scene.cycles.denoiser = 'OPENIMAGEDENOISE'
+
+        # Use the fastest GPU backend with a device present
         prefs = context.preferences
         cprefs = prefs.addons['cycles'].preferences
-        cprefs.compute_device_type = 'CUDA'  # or 'OPTIX' or 'HIP' depending on GPU
 
-        # Enable all GPU devices
+        if select_gpu_backend(cprefs) is None:
+            print("No GPU device found, rendering on CPU")
+            scene.cycles.device = 'CPU'
+            return
+
+        scene.cycles.device = 'GPU'
+
+        # Enable GPU devices only, the CPU would hold back the GPU
         for device in cprefs.devices:
-            device.use = True
+            device.use = device.type != 'CPU'
+
+
+def setup_render_settings(context, props):
+    """
+    Configure render settings for dataset generation
+
+    Args:
+        context: Blender context
+        props: CCABN properties
+    """
+    scene = context.scene
+
+    setup_render_engine(context, props)
 
     # Set resolution
     scene.render.resolution_x = 240
@@ -88,25 +213,62 @@ def setup_render_settings(context, props):
     scene.render.image_settings.color_mode = 'BW'
     scene.render.image_settings.file_format = 'PNG'
 
+    # 8-bit PNGs with fast compression, in case the scene was set up otherwise
+    scene.render.image_settings.color_depth = '8'
+    scene.render.image_settings.compression = 15
+
     # Note: Camera FOV is controlled manually by the user
     # For OV2640 simulation, set camera FOV to 160° in the scene
 
 
-def set_world_background_gray(scene, min_gray, max_gray):
+def find_or_create_shader_node(node_tree, node_type, node_idname, node_output, output_type, output_idname):
     """
-    Set a random gray color to the world background
+    Find a shader node by type, or create one wired to the tree's output
 
     Args:
-        scene: Blender scene
-        min_gray: Minimum gray value (0.0 to 1.0)
-        max_gray: Maximum gray value (0.0 to 1.0)
+        node_tree: World or material node tree
+        node_type: Node type to look for (e.g. 'BACKGROUND')
+        node_idname: Node class to create if none exists (e.g. 'ShaderNodeBackground')
+        node_output: Name of the new node's output linked to the surface
+        output_type: Output node type (e.g. 'OUTPUT_WORLD')
+        output_idname: Output node class to create if none exists
 
     Returns:
-        The gray value that was set
+        The found or created node
+    """
+    nodes = node_tree.nodes
+
+    for node in nodes:
+        if node.type == node_type:
+            return node
+
+    # Create the node if it doesn't exist
+    shader_node = nodes.new(node_idname)
+    output = None
+    for node in nodes:
+        if node.type == output_type:
+            output = node
+            break
+    if not output:
+        output = nodes.new(output_idname)
+    node_tree.links.new(shader_node.outputs[node_output], output.inputs['Surface'])
+
+    return shader_node
+
+
+def prepare_world_background(scene):
     """
-    # Generate random gray value
-    gray_value = random.uniform(min_gray, max_gray)
+    Set up the world background node for gray backgrounds
+
+    Done once per job, so setting the gray for each image is a single
+    socket write instead of a scan of the world's nodes.
+
+    Args:
+        scene: Blender scene
 
+    Returns:
+        The Background node's color input socket
+    """
     # Ensure world exists
     if not scene.world:
         scene.world = bpy.data.worlds.new("World")
@@ -117,42 +279,29 @@ def set_world_background_gray(scene, min_gray, max_gray):
     world.use_nodes = True
 
     # Find or create Background node
-    bg_node = None
-    for node in world.node_tree.nodes:
-        if node.type == 'BACKGROUND':
-            bg_node = node
-            break
+    bg_node = find_or_create_shader_node(
+        world.node_tree,
+        'BACKGROUND', 'ShaderNodeBackground', 'Background',
+        'OUTPUT_WORLD', 'ShaderNodeOutputWorld'
+    )
 
-    if not bg_node:
-        # Create Background node if it doesn't exist
-        bg_node = world.node_tree.nodes.new('ShaderNodeBackground')
-        output = None
-        for node in world.node_tree.nodes:
-            if node.type == 'OUTPUT_WORLD':
-                output = node
-                break
-        if not output:
-            output = world.node_tree.nodes.new('ShaderNodeOutputWorld')
-        world.node_tree.links.new(bg_node.outputs['Background'], output.inputs['Surface'])
-
-    # Set the background color to the random gray
-    bg_node.inputs['Color'].default_value = (gray_value, gray_value, gray_value, 1.0)
     bg_node.inputs['Strength'].default_value = 1.0
 
-    return gray_value
+    return bg_node.inputs['Color']
 
 
-def set_random_gray_material(obj, min_gray, max_gray):
+def prepare_headset_material(obj):
     """
-    Set a random gray color to an object's material
+    Set up an object's material for gray colors
+
+    Creates the material and Principled BSDF if needed. Done once per job,
+    so setting the gray for each image is a single socket write.
 
     Args:
         obj: Object with material
-        min_gray: Minimum gray value (0.0 to 1.0)
-        max_gray: Maximum gray value (0.0 to 1.0)
 
     Returns:
-        The gray value that was set
+        The Principled BSDF's base color input socket, or None without an object
     """
     if not obj or not obj.data.materials:
         # Create a material if it doesn't exist
@@ -172,292 +321,511 @@ def set_random_gray_material(obj, min_gray, max_gray):
     if not mat.use_nodes:
         mat.use_nodes = True
 
-    # Generate random gray value
-    gray_value = random.uniform(min_gray, max_gray)
-
     # Find or create Principled BSDF node
-    principled = None
-    for node in mat.node_tree.nodes:
-        if node.type == 'BSDF_PRINCIPLED':
-            principled = node
-            break
+    principled = find_or_create_shader_node(
+        mat.node_tree,
+        'BSDF_PRINCIPLED', 'ShaderNodeBsdfPrincipled', 'BSDF',
+        'OUTPUT_MATERIAL', 'ShaderNodeOutputMaterial'
+    )
+
+    return principled.inputs['Base Color']
+
+
+def resolve_blendshape_indices(obj, blendshape_configs):
+    """
+    Resolve selected blendshapes to shape key indices on an object
+
+    Indices differ between meshes, so this is done once per human rather
+    than looking shape keys up by name for every image. The shape key
+    datablock and value buffer are kept too and reused for every image
+    of the human.
+
+    Args:
+        obj: Mesh object with shape keys
+        blendshape_configs: List of (name, min, max) tuples
+
+    Returns:
+        Dictionary with the shape 'names', their key block 'indices',
+        the 'mins' and 'maxs' of their ranges, the object's 'shape_keys'
+        (None if it has none), its 'key_blocks' and the reusable 'values'
+        buffer (all key blocks)
+    """
+    resolved = []
+    num_key_blocks = 0
+    shape_keys = obj.data.shape_keys
+    key_blocks = None
+
+    if shape_keys:
+        key_blocks = shape_keys.key_blocks
+        num_key_blocks = len(key_blocks)
+        for shape_name, min_val, max_val in blendshape_configs:
+            index = key_blocks.find(shape_name)
+            if index >= 0:
+                resolved.append((shape_name, index, min_val, max_val))
+
+    # Shape keys that aren't randomized keep their current values
+    values = np.empty(num_key_blocks, dtype=np.float32)
+    if num_key_blocks:
+        key_blocks.foreach_get("value", values)
+
+    return {
+        'names': [shape_name for shape_name, _, _, _ in resolved],
+        'indices': np.array([index for _, index, _, _ in resolved], dtype=np.intp),
+        'mins': np.array([min_val for _, _, min_val, _ in resolved], dtype=np.float64),
+        'maxs': np.array([max_val for _, _, _, max_val in resolved], dtype=np.float64),
+        'shape_keys': shape_keys,
+        'key_blocks': key_blocks,
+        'values': values,
+    }
+
+
+def sample_human_randomizations(props, resolved_configs, num_lights, images_per_human, rng):
+    """
+    Draw every random value for one human's images in a single call
+
+    Each row of the sample matrix holds everything randomized for one
+    image. Rows are returned as views split per randomized property.
+
+    Args:
+        props: CCABN properties
+        resolved_configs: Dictionary from resolve_blendshape_indices
+        num_lights: Number of randomized lights
+        images_per_human: Number of images (rows) to sample
+        rng: NumPy random Generator
+
+    Returns:
+        Dictionary of sample arrays with one row per image: 'blendshapes',
+        'background_gray', 'headset_gray', 'camera_location',
+        'camera_rotation' (radians), 'light_location', 'light_intensity'
+        (percent) and 'light_temp' (Kelvin)
+    """
+    num_shapes = len(resolved_configs['names'])
+
+    camera_pos_var = (props.camera_pos_x_var, props.camera_pos_y_var, props.camera_pos_z_var)
+    camera_rot_var = (props.camera_rot_x_var, props.camera_rot_y_var, props.camera_rot_z_var)
+    light_pos_var = (props.light_pos_x_var, props.light_pos_y_var, props.light_pos_z_var)
+
+    # Column layout: blendshapes, background gray, headset gray,
+    # camera location xyz, camera rotation xyz, then xyz, intensity
+    # and temperature for every light
+    light_lows = [-v for v in light_pos_var] + [props.light_intensity_min, props.light_temp_min]
+    light_highs = list(light_pos_var) + [props.light_intensity_max, props.light_temp_max]
+
+    lows = np.concatenate((
+        resolved_configs['mins'],
+        (props.background_gray_min, props.headset_gray_min),
+        [-v for v in camera_pos_var],
+        [-v for v in camera_rot_var],
+        np.tile(light_lows, num_lights),
+    ))
+    highs = np.concatenate((
+        resolved_configs['maxs'],
+        (props.background_gray_max, props.headset_gray_max),
+        camera_pos_var,
+        camera_rot_var,
+        np.tile(light_highs, num_lights),
+    ))
 
-    if not principled:
-        # Create Principled BSDF if it doesn't exist
-        principled = mat.node_tree.nodes.new('ShaderNodeBsdfPrincipled')
-        output = None
-        for node in mat.node_tree.nodes:
-            if node.type == 'OUTPUT_MATERIAL':
-                output = node
-                break
-        if not output:
-            output = mat.node_tree.nodes.new('ShaderNodeOutputMaterial')
-        mat.node_tree.links.new(principled.outputs['BSDF'], output.inputs['Surface'])
+    samples = rng.uniform(lows, highs, size=(images_per_human, len(lows)))
 
-    # Set the base color to the random gray
-    principled.inputs['Base Color'].default_value = (gray_value, gray_value, gray_value, 1.0)
+    camera_col = num_shapes + 2
+    lights = samples[:, camera_col + 6:].reshape(images_per_human, num_lights, 5)
 
-    return gray_value
+    return {
+        'blendshapes': samples[:, :num_shapes],
+        'background_gray': samples[:, num_shapes],
+        'headset_gray': samples[:, num_shapes + 1],
+        'camera_location': samples[:, camera_col:camera_col + 3],
+        # Convert all rotations from degrees at once
+        'camera_rotation': np.radians(samples[:, camera_col + 3:camera_col + 6]),
+        'light_location': lights[:, :, :3],
+        'light_intensity': lights[:, :, 3],
+        'light_temp': lights[:, :, 4],
+    }
 
 
-def randomize_blendshapes(obj, blendshape_configs):
+def randomize_blendshapes(obj, resolved_configs, sampled):
     """
-    Randomize shape key values on an object
+    Apply sampled shape key values to an object
 
     Args:
         obj: Mesh object with shape keys
-        blendshape_configs: List of (name, min, max) tuples
+        resolved_configs: Dictionary from resolve_blendshape_indices
+        sampled: Pre-sampled values of the resolved blendshapes
 
     Returns:
         Dictionary of {blendshape_name: value}
     """
-    if not obj.data.shape_keys:
+    shape_keys = resolved_configs['shape_keys']
+    if not shape_keys:
         return {}
 
-    randomized = {}
+    # Write all shape key values in bulk instead of per key block
+    values = resolved_configs['values']
+    values[resolved_configs['indices']] = sampled
+    resolved_configs['key_blocks'].foreach_set("value", values)
 
-    for shape_name, min_val, max_val in blendshape_configs:
-        # Find the shape key
-        shape_key = obj.data.shape_keys.key_blocks.get(shape_name)
-        if shape_key:
-            value = random.uniform(min_val, max_val)
-            shape_key.value = value
-            randomized[shape_name] = value
+    # foreach_set bypasses RNA updates, so tag the shape keys for re-evaluation
+    shape_keys.update_tag()
+    obj.update_tag(refresh={'DATA'})
 
-    return randomized
+    return dict(zip(resolved_configs['names'], sampled.tolist()))
 
 
-def randomize_camera(camera, props, base_location, base_rotation):
+def randomize_camera(camera, base_location, base_rotation, location_offset, rotation_offset):
     """
-    Randomize camera position and rotation
+    Offset camera position and rotation
 
     Args:
         camera: Camera object
-        props: CCABN properties
         base_location: Original camera location (Vector)
         base_rotation: Original camera rotation (Euler)
+        location_offset: Pre-sampled xyz location offset
+        rotation_offset: Pre-sampled xyz rotation offset in radians
     """
-    # Randomize position
-    new_location = Vector((
-        base_location.x + random.uniform(-props.camera_pos_x_var, props.camera_pos_x_var),
-        base_location.y + random.uniform(-props.camera_pos_y_var, props.camera_pos_y_var),
-        base_location.z + random.uniform(-props.camera_pos_z_var, props.camera_pos_z_var),
-    ))
-    camera.location = new_location
+    # Offset position
+    camera.location = base_location + Vector(location_offset)
 
-    # Randomize rotation (convert degrees to radians)
-    new_rotation = Euler((
-        base_rotation.x + math.radians(random.uniform(-props.camera_rot_x_var, props.camera_rot_x_var)),
-        base_rotation.y + math.radians(random.uniform(-props.camera_rot_y_var, props.camera_rot_y_var)),
-        base_rotation.z + math.radians(random.uniform(-props.camera_rot_z_var, props.camera_rot_z_var)),
-    ), base_rotation.order)
-    camera.rotation_euler = new_rotation
+    # Offset rotation
+    camera.rotation_euler = Euler(Vector(base_rotation) + Vector(rotation_offset), base_rotation.order)
 
 
-def randomize_light(light, props, base_location, base_energy):
+def randomize_light(light, location, energy, color):
     """
-    Randomize light position, intensity, and color temperature
+    Set light position, intensity, and color
 
     Args:
         light: Light object
-        props: CCABN properties
-        base_location: Original light location (Vector)
-        base_energy: Original light energy/intensity
-    """
-    # Randomize position
-    new_location = Vector((
-        base_location.x + random.uniform(-props.light_pos_x_var, props.light_pos_x_var),
-        base_location.y + random.uniform(-props.light_pos_y_var, props.light_pos_y_var),
-        base_location.z + random.uniform(-props.light_pos_z_var, props.light_pos_z_var),
-    ))
-    light.location = new_location
-
-    # Randomize intensity (percentage of base energy)
-    intensity_mult = random.uniform(props.light_intensity_min, props.light_intensity_max) / 100.0
-    light.data.energy = base_energy * intensity_mult
-
-    # Randomize color temperature
-    temp = random.uniform(props.light_temp_min, props.light_temp_max)
-    rgb = kelvin_to_rgb(temp)
-    light.data.color = rgb
+        location: Randomized xyz location
+        energy: Randomized light energy/intensity
+        color: RGB color of the randomized color temperature
+    """
+    light.location = location
+    light.data.energy = energy
+    light.data.color = color
 
 
-def hide_all_humans_except(human_faces, active_human):
+def hide_all_humans_except(human_objs, active_human):
     """
     Hide all human face objects except the active one
 
     Args:
-        human_faces: Collection of ObjectItem instances
+        human_objs: List of human face objects (None for empty references)
         active_human: The object to keep visible
     """
-    for item in human_faces:
-        if not item.obj:
+    active_pointer = active_human.as_pointer()
+
+    for obj in human_objs:
+        if not obj:
             continue
-        item.obj.hide_render = (item.obj != active_human)
-        item.obj.hide_viewport = (item.obj != active_human)
+        hidden = obj.as_pointer() != active_pointer
+        obj.hide_render = hidden
+        obj.hide_viewport = hidden
 
 
-def render_dataset(context, props):
+def get_blendshape_configs(props):
     """
-    Main rendering loop for dataset generation
+    Get the selected blendshapes with their random ranges
 
     Args:
-        context: Blender context
         props: CCABN properties
 
     Returns:
-        Tuple of (success, message)
+        List of (name, min, max) tuples
+    """
+    blendshape_list = props.blendshape_list
+    num_shapes = len(blendshape_list)
+
+    # Copy selection flags and ranges out of the collection in bulk
+    selected = get_blendshape_selection(blendshape_list)
+
+    ranges = np.empty(num_shapes * 2, dtype=np.float32)
+    blendshape_list.foreach_get("range_values", ranges)
+    ranges = ranges.reshape(num_shapes, 2)
+
+    return [
+        (blendshape_list[i].name, float(ranges[i, 0]), float(ranges[i, 1]))
+        for i, is_selected in enumerate(selected) if is_selected
+    ]
+
+
+def iter_render_dataset(context, props, start=0, end=None, metadata_filename=METADATA_FILENAME,
+                        blendshape_configs=None):
+    """
+    Render dataset images one at a time
+
+    Images are numbered globally across all humans, so a range of image
+    indices can be rendered independently by a worker process. The
+    generator yields once when setup is done and then after every image,
+    so callers can drive the job incrementally, e.g. from a modal operator.
+    Only the setup step reads the context. Original object states are
+    restored when it finishes, raises or is closed.
+
+    Metadata of all rendered images is collected into one JSON file, saved
+    after every human and when the generator ends for any reason.
+
+    Args:
+        context: Blender context
+        props: CCABN properties
+        start: First image index to render (inclusive)
+        end: Last image index to render (exclusive), defaults to all images
+        metadata_filename: Name of the metadata file in the output directory
+        blendshape_configs: Result of get_blendshape_configs, read from props if None
+
+    Yields:
+        Tuple of (images rendered so far, images to render)
     """
+    # The job may outlive the call that created it, so keep the scene
+    # data instead of the context
     scene = context.scene
+    view_layer = context.view_layer
 
     # Setup render settings
     setup_render_settings(context, props)
 
+    # Settings the image indices depend on are fixed for the whole job
+    images_per_human = props.images_per_human
+    master_seed = props.master_seed
+    camera = props.camera
+
     # Expand output path (handles Blender's // notation and ~ expansion)
-    output_path = bpy.path.abspath(props.output_path)
-    output_path = os.path.expanduser(os.path.expandvars(output_path))
-    output_dir = Path(output_path).resolve()
+    output_dir = resolve_output_dir(props.output_path)
 
     # Get selected blendshapes with ranges
-    blendshape_configs = [
-        (item.name, item.min_value, item.max_value)
-        for item in props.blendshape_list
-        if item.selected
-    ]
-
-    if not blendshape_configs:
-        return False, "No blendshapes selected"
+    if blendshape_configs is None:
+        blendshape_configs = get_blendshape_configs(props)
 
-    # Store original states
-    camera_base_loc = props.camera.location.copy()
-    camera_base_rot = props.camera.rotation_euler.copy()
+    # Resolve the world background color once for the whole job
+    bg_color_socket = prepare_world_background(scene)
 
-    light_base_states = []
-    for item in props.lights:
-        if not item.obj:
-            continue
-        light_base_states.append({
-            'obj': item.obj,
-            'location': item.obj.location.copy(),
-            'energy': item.obj.data.energy,
-        })
+    # Same for the headset material, if specified
+    headset_color_socket = None
+    if props.headset_mesh:
+        headset_color_socket = prepare_headset_material(props.headset_mesh)
 
-    # Counter for output files
-    file_counter = 1
+    # Store original states
+    camera_base_loc = camera.location.copy()
+    camera_base_rot = camera.rotation_euler.copy()
+
+    # Light states as parallel arrays, so offsets apply to all lights at once
+    light_objs = [item.obj for item in props.lights if item.obj]
+    light_base_locations = np.array([obj.location for obj in light_objs], dtype=np.float64).reshape(-1, 3)
+    light_base_energies = np.array([obj.data.energy for obj in light_objs], dtype=np.float64)
+
+    # Snapshot the face objects instead of dereferencing the collection per image
+    human_objs = [item.obj for item in props.human_faces]
+
+    total_images = len(human_objs) * images_per_human
+    if end is None:
+        end = total_images
+
+    # Zero-pad file names (at least 4 digits) so they sort correctly for the full dataset
+    name_template = f"{{:0{max(4, len(str(total_images)))}d}}.png"
+
+    # Render paths are built by string concatenation on the resolved directory
+    output_prefix = os.path.join(str(output_dir), "")
+
+    shard_images = end - start
+    rendered = 0
+    all_metadata = []
+    metadata_path = output_dir / metadata_filename
+    active_human_idx = None
+
+    # Per-image work only touches the output path and seed
+    render_settings = scene.render
+
+    # Render this scene even if the window shows another one by now
+    render_scene_name = scene.name
+    render_layer_name = view_layer.name
+    cycles_settings = scene.cycles if props.render_engine == 'CYCLES' else None
+
+    # Settings with no variation are applied once instead of for every image
+    bg_static = props.background_gray_min == props.background_gray_max
+    if bg_static:
+        bg_gray = props.background_gray_min
+        bg_color_socket.default_value = (bg_gray, bg_gray, bg_gray, 1.0)
+
+    headset_static = props.headset_gray_min == props.headset_gray_max
+    if headset_static and headset_color_socket is not None:
+        headset_gray = props.headset_gray_min
+        headset_color_socket.default_value = (headset_gray, headset_gray, headset_gray, 1.0)
+
+    camera_static = not any((
+        props.camera_pos_x_var, props.camera_pos_y_var, props.camera_pos_z_var,
+        props.camera_rot_x_var, props.camera_rot_y_var, props.camera_rot_z_var,
+    ))
 
-    total_images = len(props.human_faces) * props.images_per_human
-    current_image = 0
+    lights_static = (
+        not any((props.light_pos_x_var, props.light_pos_y_var, props.light_pos_z_var))
+        and props.light_intensity_min == props.light_intensity_max
+        and props.light_temp_min == props.light_temp_max
+    )
+    if lights_static:
+        light_color = kelvin_to_rgb(props.light_temp_min)
+        for light_obj, light_energy in zip(light_objs, light_base_energies * (props.light_intensity_min / 100.0)):
+            light_obj.data.energy = light_energy
+            light_obj.data.color = light_color
 
     try:
-        # Iterate through each human
-        for human_idx, item in enumerate(props.human_faces):
-            if not item.obj:
-                continue
+        # Hand control back before the first image, with setup done
+        yield rendered, shard_images
 
-            human = item.obj
-            print(f"\n=== Processing human {human_idx + 1}/{len(props.human_faces)}: {human.name} ===")
+        for image_index in range(start, end):
+            human_idx, img_idx = divmod(image_index, images_per_human)
+            human = human_objs[human_idx]
+            if not human:
+                continue
 
-            # Hide all other humans
-            hide_all_humans_except(props.human_faces, human)
+            if human_idx != active_human_idx:
+                # Checkpoint the metadata of the previous human
+                if all_metadata:
+                    write_metadata(metadata_path, all_metadata)
 
-            # Generate images for this human
-            for img_idx in range(props.images_per_human):
-                current_image += 1
-                progress = (current_image / total_images) * 100
+                print(f"\n=== Processing human {human_idx + 1}/{len(human_objs)}: {human.name} ===")
 
-                print(f"[{progress:.1f}%] Rendering image {file_counter} (human {human_idx + 1}, image {img_idx + 1}/{props.images_per_human})")
+                # Hide all other humans
+                hide_all_humans_except(human_objs, human)
+                active_human_idx = human_idx
 
-                # Randomize blendshapes
-                blendshape_values = randomize_blendshapes(human, blendshape_configs)
+                resolved_configs = resolve_blendshape_indices(human, blendshape_configs)
 
-                # Set random gray background (world)
-                bg_gray = set_world_background_gray(
-                    scene,
-                    props.background_gray_min,
-                    props.background_gray_max
+                # Draw all of this human's random values up front. The
+                # generator is seeded per human, so a worker rendering only
+                # part of the human's images picks the same rows
+                human_rng = np.random.default_rng((master_seed, human_idx))
+                samples = sample_human_randomizations(
+                    props, resolved_configs, len(light_objs), images_per_human, human_rng
                 )
 
-                # Set random gray headset (if specified)
-                headset_gray = None
-                if props.headset_mesh:
-                    headset_gray = set_random_gray_material(
-                        props.headset_mesh,
-                        props.headset_gray_min,
-                        props.headset_gray_max
-                    )
-
-                # Randomize camera
-                randomize_camera(props.camera, props, camera_base_loc, camera_base_rot)
+                # Absolute light locations and energies for all of the human's images
+                light_locations = light_base_locations + samples['light_location']
+                light_energies = light_base_energies * (samples['light_intensity'] / 100.0)
+                light_colors = kelvin_to_rgb_batch(samples['light_temp'])
+
+            file_number = image_index + 1
+            progress = (rendered / shard_images) * 100
+
+            print(f"[{progress:.1f}%] Rendering image {file_number} (human {human_idx + 1}, image {img_idx + 1}/{images_per_human})")
+
+            # Seed render noise for this image
+            image_seed = get_image_seed(master_seed, image_index)
+            if cycles_settings is not None:
+                cycles_settings.seed = image_seed
+
+            # Randomize blendshapes
+            blendshape_values = randomize_blendshapes(
+                human, resolved_configs, samples['blendshapes'][img_idx]
+            )
+
+            # Set random gray background (world)
+            bg_gray = float(samples['background_gray'][img_idx])
+            if not bg_static:
+                bg_color_socket.default_value = (bg_gray, bg_gray, bg_gray, 1.0)
+
+            # Set random gray headset (if specified)
+            headset_gray = None
+            if headset_color_socket is not None:
+                headset_gray = float(samples['headset_gray'][img_idx])
+                if not headset_static:
+                    headset_color_socket.default_value = (headset_gray, headset_gray, headset_gray, 1.0)
+
+            # Randomize camera
+            if not camera_static:
+                randomize_camera(
+                    camera,
+                    camera_base_loc,
+                    camera_base_rot,
+                    samples['camera_location'][img_idx],
+                    samples['camera_rotation'][img_idx]
+                )
 
-                # Randomize lights
-                for light_state in light_base_states:
+            # Randomize lights
+            if not lights_static:
+                for light_idx, light_obj in enumerate(light_objs):
                     randomize_light(
-                        light_state['obj'],
-                        props,
-                        light_state['location'],
-                        light_state['energy']
+                        light_obj,
+                        light_locations[img_idx, light_idx],
+                        light_energies[img_idx, light_idx],
+                        light_colors[img_idx, light_idx]
                     )
 
-                # Update scene
-                context.view_layer.update()
+            # Render
+            output_filename = name_template.format(file_number)
+            render_settings.filepath = output_prefix + output_filename
 
-                # Render
-                output_filename = f"{file_counter}.png"
-                render_path = output_dir / output_filename
-                scene.render.filepath = str(render_path)
+            bpy.ops.render.render(write_still=True, scene=render_scene_name, layer=render_layer_name)
 
-                bpy.ops.render.render(write_still=True)
+            # Save metadata
+            metadata = {
+                "image": output_filename,
+                "human_object": human.name,
+                "seed": image_seed,
+                "blendshapes": blendshape_values,
+                "background_gray": bg_gray,
+            }
 
-                # Save metadata
-                metadata = {
-                    "image": output_filename,
-                    "human_object": human.name,
-                    "blendshapes": blendshape_values,
-                    "background_gray": bg_gray,
-                }
+            # Add headset gray if it was used
+            if headset_gray is not None:
+                metadata["headset_gray"] = headset_gray
 
-                # Add headset gray if it was used
-                if headset_gray is not None:
-                    metadata["headset_gray"] = headset_gray
+            all_metadata.append(metadata)
 
-                metadata_path = output_dir / f"{file_counter}.json"
-                with open(metadata_path, 'w') as f:
-                    json.dump(metadata, f, indent=2)
+            rendered += 1
+            yield rendered, shard_images
 
-                file_counter += 1
+    finally:
+        # Save metadata of everything rendered, including after a failure
+        if all_metadata:
+            write_metadata(metadata_path, all_metadata)
 
         # Restore original states
-        props.camera.location = camera_base_loc
-        props.camera.rotation_euler = camera_base_rot
+        camera.location = camera_base_loc
+        camera.rotation_euler = camera_base_rot
 
-        for light_state in light_base_states:
-            light_state['obj'].location = light_state['location']
-            light_state['obj'].data.energy = light_state['energy']
+        for light_idx, light_obj in enumerate(light_objs):
+            light_obj.location = light_base_locations[light_idx]
+            light_obj.data.energy = light_base_energies[light_idx]
 
         # Show all humans again
-        for item in props.human_faces:
-            if item.obj:
-                item.obj.hide_render = False
-                item.obj.hide_viewport = False
+        for human in human_objs:
+            if human:
+                human.hide_render = False
+                human.hide_viewport = False
 
-        context.view_layer.update()
+        view_layer.update()
 
-        return True, f"Successfully generated {total_images} images"
 
-    except Exception as e:
-        # On error, still restore states
-        props.camera.location = camera_base_loc
-        props.camera.rotation_euler = camera_base_rot
+def render_dataset(context, props, start=0, end=None, metadata_filename=METADATA_FILENAME,
+                   stop_path=None):
+    """
+    Main rendering loop for dataset generation
+
+    Args:
+        context: Blender context
+        props: CCABN properties
+        start: First image index to render (inclusive)
+        end: Last image index to render (exclusive), defaults to all images
+        metadata_filename: Name of the metadata file in the output directory
+        stop_path: File whose existence stops rendering after the current image
+
+    Returns:
+        Tuple of (success, message)
+    """
+    blendshape_configs = get_blendshape_configs(props)
+    if not blendshape_configs:
+        return False, "No blendshapes selected"
 
-        for light_state in light_base_states:
-            light_state['obj'].location = light_state['location']
-            light_state['obj'].data.energy = light_state['energy']
+    rendered = 0
 
-        for item in props.human_faces:
-            if item.obj:
-                item.obj.hide_render = False
-                item.obj.hide_viewport = False
+    job = iter_render_dataset(context, props, start, end, metadata_filename, blendshape_configs)
 
-        context.view_layer.update()
+    try:
+        for rendered, _ in job:
+            if stop_path and os.path.exists(stop_path):
+                # Closing the job saves the metadata and restores the scene
+                job.close()
+                return True, f"Stopped after {rendered} images"
+    except Exception as e:
+        return False, f"Error during rendering: {str(e)}. Saved {rendered} images before failure."
 
-        return False, f"Error during rendering: {str(e)}. Saved {file_counter - 1} images before failure."
+    return True, f"Successfully generated {rendered} images"
@@ -3,8 +3,53 @@ UI Panel for CCABN Dataset Generator
 """
 
 import bpy
+from bpy.props import BoolProperty
 from bpy.types import Panel, UIList
 
+from .utils import get_blendshape_selection
+
+# Total images label for the last drawn (human count, images per human)
+_draw_cache = {"key": None, "total_label": ""}
+
+
+def _get_total_images_label(num_humans, images_per_human):
+    """Get the total images label, formatting it only when the counts change"""
+    key = (num_humans, images_per_human)
+    if key != _draw_cache["key"]:
+        _draw_cache["key"] = key
+        _draw_cache["total_label"] = f"Total images: {num_humans * images_per_human}"
+    return _draw_cache["total_label"]
+
+
+# Labeled rows of properties drawn side by side, per sub-panel
+_GRAY_RANGE_ROWS = (
+    ("Background Gray Range:", ("background_gray_min", "background_gray_max")),
+    ("Headset Gray Range:", ("headset_gray_min", "headset_gray_max")),
+)
+
+_CAMERA_VARIATION_ROWS = (
+    ("Position (meters):", ("camera_pos_x_var", "camera_pos_y_var", "camera_pos_z_var")),
+    ("Rotation (degrees):", ("camera_rot_x_var", "camera_rot_y_var", "camera_rot_z_var")),
+)
+
+_LIGHT_VARIATION_ROWS = (
+    ("Position (meters):", ("light_pos_x_var", "light_pos_y_var", "light_pos_z_var")),
+    ("Intensity (%):", ("light_intensity_min", "light_intensity_max")),
+    ("Color Temperature (K):", ("light_temp_min", "light_temp_max")),
+)
+
+
+def _draw_prop_rows(layout, props, rows):
+    """Draw each labeled group of properties as one aligned row"""
+    col = layout.column(align=True)
+    for index, (label_text, prop_names) in enumerate(rows):
+        if index:
+            col.separator()
+        col.label(text=label_text)
+        row = col.row(align=True)
+        for prop_name in prop_names:
+            row.prop(props, prop_name)
+
 
 class CCABN_UL_ObjectList(UIList):
     """UI List for objects (lights and human faces)"""
@@ -34,14 +79,48 @@ class CCABN_UL_BlendshapeList(UIList):
             row.label(text=item.name)
 
             # Min/Max range
-            row.prop(item, "min_value", text="")
+            row.prop(item, "range_values", index=0, text="")
             row.label(text="-")
-            row.prop(item, "max_value", text="")
+            row.prop(item, "range_values", index=1, text="")
 
         elif self.layout_type == 'GRID':
             layout.alignment = 'CENTER'
             layout.prop(item, "selected", text="")
 
+    filter_selected: BoolProperty(
+        name="Selected Only",
+        default=False,
+        description="Only show blendshapes selected for randomization"
+    )
+
+    def draw_filter(self, context, layout):
+        row = layout.row(align=True)
+        row.prop(self, "filter_name", text="")
+        row.prop(self, "use_filter_invert", text="", icon='ARROW_LEFTRIGHT')
+        row.prop(self, "filter_selected", text="", icon='CHECKBOX_HLT')
+
+    def filter_items(self, context, data, propname):
+        # Without an active filter every item is shown, skip building flags
+        if not self.filter_name and not self.filter_selected:
+            return [], []
+
+        items = getattr(data, propname)
+        num_items = len(items)
+
+        if self.filter_name:
+            flags = bpy.types.UI_UL_list.filter_items_by_name(
+                self.filter_name, self.bitflag_filter_item, items, "name"
+            )
+        else:
+            flags = [self.bitflag_filter_item] * num_items
+
+        if self.filter_selected:
+            selected = get_blendshape_selection(items)
+            flags = [flag if is_selected else 0 for flag, is_selected in zip(flags, selected)]
+
+        # Items are kept sorted by name, so no reordering is needed
+        return flags, []
+
 
 class CCABN_PT_MainPanel(Panel):
     """Main panel for CCABN Dataset Generator"""
@@ -55,15 +134,42 @@ class CCABN_PT_MainPanel(Panel):
         layout = self.layout
         props = context.scene.ccabn_props
 
-        # Scene Setup Section
-        box = layout.box()
-        box.label(text="Scene Setup", icon='SCENE_DATA')
+        # Generate Button
+        if props.is_rendering:
+            layout.label(text="Rendering in progress...", icon='RENDER_ANIMATION')
+        else:
+            layout.label(text=_get_total_images_label(len(props.human_faces), props.images_per_human), icon='RENDER_STILL')
+            layout.operator("ccabn.generate_dataset", icon='PLAY', text="Generate Dataset")
+
+
+class CCABN_PT_SubPanel:
+    """Shared settings for the sections shown under the main panel, locked while a job renders"""
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = 'CCABN'
+    bl_parent_id = "CCABN_PT_main_panel"
+    header_icon = 'NONE'
+
+    def draw_header(self, context):
+        self.layout.label(icon=self.header_icon)
+
 
-        box.prop_search(props, "camera", context.scene, "objects", text="Camera")
+class CCABN_PT_SceneSetup(CCABN_PT_SubPanel, Panel):
+    """Camera, lights, human faces and headset"""
+    bl_label = "Scene Setup"
+    bl_idname = "CCABN_PT_scene_setup"
+    header_icon = 'SCENE_DATA'
+
+    def draw(self, context):
+        layout = self.layout
+        props = context.scene.ccabn_props
+        layout.enabled = not props.is_rendering
+
+        layout.prop_search(props, "camera", context.scene, "objects", text="Camera")
 
         # Lights list
-        box.label(text="Lights:")
-        row = box.row()
+        layout.label(text="Lights:")
+        row = layout.row()
         row.template_list(
             "CCABN_UL_ObjectList",
             "lights",
@@ -77,11 +183,11 @@ class CCABN_PT_MainPanel(Panel):
         col.operator("ccabn.add_light", icon='ADD', text="")
         col.operator("ccabn.remove_light", icon='REMOVE', text="")
 
-        box.label(text="Select a light in the scene and click +", icon='INFO')
+        layout.label(text="Select a light in the scene and click +", icon='INFO')
 
         # Human faces list
-        box.label(text="Human Faces:")
-        row = box.row()
+        layout.label(text="Human Faces:")
+        row = layout.row()
         row.template_list(
             "CCABN_UL_ObjectList",
             "human_faces",
@@ -94,47 +200,58 @@ class CCABN_PT_MainPanel(Panel):
         col = row.column(align=True)
         col.operator("ccabn.add_human_face", icon='ADD', text="")
         col.operator("ccabn.remove_human_face", icon='REMOVE', text="")
+        col.separator()
+        col.operator("ccabn.add_selected_human_faces", icon='RESTRICT_SELECT_OFF', text="")
+        col.operator("ccabn.clear_human_faces", icon='X', text="")
 
-        box.label(text="Select a mesh in the scene and click +", icon='INFO')
+        layout.label(text="Select a mesh in the scene and click +", icon='INFO')
 
-        box.prop_search(props, "headset_mesh", context.scene, "objects", text="Headset Mesh (Optional)")
+        layout.prop_search(props, "headset_mesh", context.scene, "objects", text="Headset Mesh (Optional)")
 
         # Human face conversion
         if len(props.human_faces) > 0:
-            row = box.row()
+            row = layout.row()
             row.operator("ccabn.convert_blendshapes", icon='FILE_REFRESH')
 
-        # Gray Tone Ranges Section
-        box = layout.box()
-        box.label(text="Random Gray Tones", icon='COLOR')
 
-        col = box.column(align=True)
-        col.label(text="Background Gray Range:")
-        row = col.row(align=True)
-        row.prop(props, "background_gray_min")
-        row.prop(props, "background_gray_max")
+class CCABN_PT_GrayTones(CCABN_PT_SubPanel, Panel):
+    """Background and headset gray ranges"""
+    bl_label = "Random Gray Tones"
+    bl_idname = "CCABN_PT_gray_tones"
+    header_icon = 'COLOR'
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        props = context.scene.ccabn_props
+        layout.enabled = not props.is_rendering
+
+        _draw_prop_rows(layout, props, _GRAY_RANGE_ROWS)
+
+        layout.label(text="0.0 = Black, 1.0 = White", icon='INFO')
 
-        col.separator()
-        col.label(text="Headset Gray Range:")
-        row = col.row(align=True)
-        row.prop(props, "headset_gray_min")
-        row.prop(props, "headset_gray_max")
 
-        box.label(text="0.0 = Black, 1.0 = White", icon='INFO')
+class CCABN_PT_Blendshapes(CCABN_PT_SubPanel, Panel):
+    """Blendshape selection and ranges"""
+    bl_label = "Blendshapes"
+    bl_idname = "CCABN_PT_blendshapes"
+    header_icon = 'SHAPEKEY_DATA'
+    bl_options = {'DEFAULT_CLOSED'}
 
-        # Blendshapes Section
-        box = layout.box()
-        box.label(text="Blendshapes", icon='SHAPEKEY_DATA')
+    def draw(self, context):
+        layout = self.layout
+        props = context.scene.ccabn_props
+        layout.enabled = not props.is_rendering
 
-        row = box.row()
+        row = layout.row()
         row.operator("ccabn.refresh_blendshapes", icon='FILE_REFRESH')
 
         if len(props.blendshape_list) > 0:
-            row = box.row()
+            row = layout.row()
             row.operator("ccabn.select_all_blendshapes", text="All")
             row.operator("ccabn.deselect_all_blendshapes", text="None")
 
-            box.template_list(
+            layout.template_list(
                 "CCABN_UL_BlendshapeList",
                 "",
                 props,
@@ -144,72 +261,66 @@ class CCABN_PT_MainPanel(Panel):
                 rows=6
             )
 
-            box.label(text="Min/Max: Random range (0.0 - 1.0)", icon='INFO')
+            layout.label(text="Min/Max: Random range (0.0 - 1.0)", icon='INFO')
         else:
-            box.label(text="No blendshapes found", icon='ERROR')
-            box.label(text="Select human faces and click Refresh")
+            layout.label(text="No blendshapes found", icon='ERROR')
+            layout.label(text="Select human faces and click Refresh")
 
-        # Camera Variation Section
-        box = layout.box()
-        box.label(text="Camera Variations", icon='CAMERA_DATA')
 
-        col = box.column(align=True)
-        col.label(text="Position (meters):")
-        row = col.row(align=True)
-        row.prop(props, "camera_pos_x_var")
-        row.prop(props, "camera_pos_y_var")
-        row.prop(props, "camera_pos_z_var")
+class CCABN_PT_CameraVariations(CCABN_PT_SubPanel, Panel):
+    """Camera position and rotation variation"""
+    bl_label = "Camera Variations"
+    bl_idname = "CCABN_PT_camera_variations"
+    header_icon = 'CAMERA_DATA'
+    bl_options = {'DEFAULT_CLOSED'}
 
-        col.separator()
-        col.label(text="Rotation (degrees):")
-        row = col.row(align=True)
-        row.prop(props, "camera_rot_x_var")
-        row.prop(props, "camera_rot_y_var")
-        row.prop(props, "camera_rot_z_var")
+    def draw(self, context):
+        layout = self.layout
+        props = context.scene.ccabn_props
+        layout.enabled = not props.is_rendering
 
-        # Light Variation Section
-        box = layout.box()
-        box.label(text="Light Variations", icon='LIGHT')
+        _draw_prop_rows(layout, props, _CAMERA_VARIATION_ROWS)
 
-        col = box.column(align=True)
-        col.label(text="Position (meters):")
-        row = col.row(align=True)
-        row.prop(props, "light_pos_x_var")
-        row.prop(props, "light_pos_y_var")
-        row.prop(props, "light_pos_z_var")
 
-        col.separator()
-        col.label(text="Intensity (%):")
-        row = col.row(align=True)
-        row.prop(props, "light_intensity_min")
-        row.prop(props, "light_intensity_max")
+class CCABN_PT_LightVariations(CCABN_PT_SubPanel, Panel):
+    """Light position, intensity and color temperature variation"""
+    bl_label = "Light Variations"
+    bl_idname = "CCABN_PT_light_variations"
+    header_icon = 'LIGHT'
+    bl_options = {'DEFAULT_CLOSED'}
 
-        col.separator()
-        col.label(text="Color Temperature (K):")
-        row = col.row(align=True)
-        row.prop(props, "light_temp_min")
-        row.prop(props, "light_temp_max")
+    def draw(self, context):
+        layout = self.layout
+        props = context.scene.ccabn_props
+        layout.enabled = not props.is_rendering
 
-        # Output Settings Section
-        box = layout.box()
-        box.label(text="Output Settings", icon='OUTPUT')
+        _draw_prop_rows(layout, props, _LIGHT_VARIATION_ROWS)
 
-        box.prop(props, "output_path", text="")
-        box.prop(props, "images_per_human")
-        box.prop(props, "render_engine", text="Engine")
 
-        box.label(text="Resolution: 240x240 grayscale", icon='INFO')
-        box.label(text="Set camera FOV to 160° for OV2640 simulation", icon='INFO')
+class CCABN_PT_OutputSettings(CCABN_PT_SubPanel, Panel):
+    """Output folder, render engine and job settings"""
+    bl_label = "Output Settings"
+    bl_idname = "CCABN_PT_output_settings"
+    header_icon = 'OUTPUT'
 
-        # Generate Button
-        layout.separator()
+    def draw(self, context):
+        layout = self.layout
+        props = context.scene.ccabn_props
+        layout.enabled = not props.is_rendering
 
-        if props.is_rendering:
-            layout.label(text="Rendering in progress...", icon='RENDER_ANIMATION')
-        else:
-            total_images = len(props.human_faces) * props.images_per_human
-            layout.label(text=f"Total images: {total_images}", icon='RENDER_STILL')
-            layout.operator("ccabn.generate_dataset", icon='PLAY', text="Generate Dataset")
+        layout.prop(props, "output_path", text="")
+        layout.prop(props, "images_per_human")
+        layout.prop(props, "render_engine", text="Engine")
+        if props.render_engine == 'CYCLES':
+            row = layout.row(align=True)
+            row.prop(props, "cycles_samples")
+            row.prop(props, "use_denoising")
+        layout.prop(props, "master_seed")
+        layout.prop(props, "images_shards")
+        layout.prop(props, "verbose_logging")
+
+        layout.label(text="Resolution: 240x240 grayscale", icon='INFO')
+        layout.label(text="Set camera FOV to 160° for OV2640 simulation", icon='INFO')
 
 
 # Registration
@@ -217,7 +328,14 @@ classes = (
     CCABN_UL_ObjectList,
     CCABN_UL_BlendshapeList,
     CCABN_PT_MainPanel,
+    CCABN_PT_SceneSetup,
+    CCABN_PT_GrayTones,
+    CCABN_PT_Blendshapes,
+    CCABN_PT_CameraVariations,
+    CCABN_PT_LightVariations,
+    CCABN_PT_OutputSettings,
 )
+_classes_rev = classes[::-1]
 
 
 def register():
@@ -226,5 +344,5 @@ def register():
 
 
 def unregister():
-    for cls in reversed(classes):
+    for cls in _classes_rev:
         bpy.utils.unregister_class(cls)
@@ -3,82 +3,109 @@ Utility functions and constants for CCABN Dataset Generator
 """
 
 import os
+import json
+import atexit
 import bpy
+from functools import lru_cache
+from types import MappingProxyType
 from pathlib import Path
 
+# orjson isn't bundled with Blender; use it for metadata if it's installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # ARKit to Unified Expressions mapping
 # Only includes 1:1 mappings that exist in both standards
-ARKIT_TO_UNIFIED = {
+_ARKIT_TO_UNIFIED_PAIRS = (
     # Eye movements
-    "eyeLookUpRight": "EyeLookUpRight",
-    "eyeLookDownRight": "EyeLookDownRight",
-    "eyeLookInRight": "EyeLookInRight",
-    "eyeLookOutRight": "EyeLookOutRight",
-    "eyeLookUpLeft": "EyeLookUpLeft",
-    "eyeLookDownLeft": "EyeLookDownLeft",
-    "eyeLookInLeft": "EyeLookInLeft",
-    "eyeLookOutLeft": "EyeLookOutLeft",
+    ("eyeLookUpRight", "EyeLookUpRight"),
+    ("eyeLookDownRight", "EyeLookDownRight"),
+    ("eyeLookInRight", "EyeLookInRight"),
+    ("eyeLookOutRight", "EyeLookOutRight"),
+    ("eyeLookUpLeft", "EyeLookUpLeft"),
+    ("eyeLookDownLeft", "EyeLookDownLeft"),
+    ("eyeLookInLeft", "EyeLookInLeft"),
+    ("eyeLookOutLeft", "EyeLookOutLeft"),
 
     # Eye expressions
-    "eyeBlinkRight": "EyeClosedRight",
-    "eyeBlinkLeft": "EyeClosedLeft",
-    "eyeSquintRight": "EyeSquintRight",
-    "eyeSquintLeft": "EyeSquintLeft",
-    "eyeWideRight": "EyeWideRight",
-    "eyeWideLeft": "EyeWideLeft",
+    ("eyeBlinkRight", "EyeClosedRight"),
+    ("eyeBlinkLeft", "EyeClosedLeft"),
+    ("eyeSquintRight", "EyeSquintRight"),
+    ("eyeSquintLeft", "EyeSquintLeft"),
+    ("eyeWideRight", "EyeWideRight"),
+    ("eyeWideLeft", "EyeWideLeft"),
 
     # Brow expressions
-    "browDownRight": "BrowDownRight",
-    "browDownLeft": "BrowDownLeft",
-    "browInnerUp": "BrowInnerUp",
-    "browOuterUpRight": "BrowOuterUpRight",
-    "browOuterUpLeft": "BrowOuterUpLeft",
+    ("browDownRight", "BrowDownRight"),
+    ("browDownLeft", "BrowDownLeft"),
+    ("browInnerUp", "BrowInnerUp"),
+    ("browOuterUpRight", "BrowOuterUpRight"),
+    ("browOuterUpLeft", "BrowOuterUpLeft"),
 
     # Nose
-    "noseSneerRight": "NoseSneerRight",
-    "noseSneerLeft": "NoseSneerLeft",
+    ("noseSneerRight", "NoseSneerRight"),
+    ("noseSneerLeft", "NoseSneerLeft"),
 
     # Cheeks
-    "cheekSquintRight": "CheekSquintRight",
-    "cheekSquintLeft": "CheekSquintLeft",
-    "cheekPuff": "CheekPuff",
+    ("cheekSquintRight", "CheekSquintRight"),
+    ("cheekSquintLeft", "CheekSquintLeft"),
+    ("cheekPuff", "CheekPuff"),
 
     # Jaw
-    "jawOpen": "JawOpen",
-    "mouthClose": "MouthClosed",
-    "jawRight": "JawRight",
-    "jawLeft": "JawLeft",
-    "jawForward": "JawForward",
+    ("jawOpen", "JawOpen"),
+    ("mouthClose", "MouthClosed"),
+    ("jawRight", "JawRight"),
+    ("jawLeft", "JawLeft"),
+    ("jawForward", "JawForward"),
 
     # Lips
-    "mouthRollUpper": "LipSuckUpper",
-    "mouthRollLower": "LipSuckLower",
-    "mouthFunnel": "LipFunnel",
-    "mouthPucker": "LipPucker",
+    ("mouthRollUpper", "LipSuckUpper"),
+    ("mouthRollLower", "LipSuckLower"),
+    ("mouthFunnel", "LipFunnel"),
+    ("mouthPucker", "LipPucker"),
 
     # Mouth movements
-    "mouthUpperUpRight": "MouthUpperUpRight",
-    "mouthUpperUpLeft": "MouthUpperUpLeft",
-    "mouthLowerDownRight": "MouthLowerDownRight",
-    "mouthLowerDownLeft": "MouthLowerDownLeft",
+    ("mouthUpperUpRight", "MouthUpperUpRight"),
+    ("mouthUpperUpLeft", "MouthUpperUpLeft"),
+    ("mouthLowerDownRight", "MouthLowerDownRight"),
+    ("mouthLowerDownLeft", "MouthLowerDownLeft"),
 
     # Mouth expressions
-    "mouthSmileRight": "MouthSmileRight",
-    "mouthSmileLeft": "MouthSmileLeft",
-    "mouthFrownRight": "MouthFrownRight",
-    "mouthFrownLeft": "MouthFrownLeft",
-    "mouthDimpleRight": "MouthDimpleRight",
-    "mouthDimpleLeft": "MouthDimpleLeft",
-    "mouthStretchRight": "MouthStretchRight",
-    "mouthStretchLeft": "MouthStretchLeft",
-    "mouthPressRight": "MouthPressRight",
-    "mouthPressLeft": "MouthPressLeft",
-    "mouthShrugUpper": "MouthUpperRight",  # Approximate mapping
-    "mouthShrugLower": "MouthLowerRight",  # Approximate mapping
-}
-
-# Reverse mapping for potential future use
-UNIFIED_TO_ARKIT = {v: k for k, v in ARKIT_TO_UNIFIED.items()}
+    ("mouthSmileRight", "MouthSmileRight"),
+    ("mouthSmileLeft", "MouthSmileLeft"),
+    ("mouthFrownRight", "MouthFrownRight"),
+    ("mouthFrownLeft", "MouthFrownLeft"),
+    ("mouthDimpleRight", "MouthDimpleRight"),
+    ("mouthDimpleLeft", "MouthDimpleLeft"),
+    ("mouthStretchRight", "MouthStretchRight"),
+    ("mouthStretchLeft", "MouthStretchLeft"),
+    ("mouthPressRight", "MouthPressRight"),
+    ("mouthPressLeft", "MouthPressLeft"),
+    ("mouthShrugUpper", "MouthUpperRight"),  # Approximate mapping
+    ("mouthShrugLower", "MouthLowerRight"),  # Approximate mapping
+)
+ARKIT_TO_UNIFIED = MappingProxyType(dict(_ARKIT_TO_UNIFIED_PAIRS))
+ARKIT_KEYS = frozenset(ARKIT_TO_UNIFIED)
+
+# Image file extensions, as a set for membership tests and a tuple for str.endswith
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.bmp', '.tga', '.exr', '.hdr'})
+IMAGE_EXTENSIONS_TUPLE = tuple(sorted(IMAGE_EXTENSIONS))
+
+# Metadata of all images in the output directory
+METADATA_FILENAME = "metadata.json"
+
+
+@lru_cache(maxsize=1)
+def unified_to_arkit():
+    """
+    Get the reverse of ARKIT_TO_UNIFIED, built on first use
+
+    Returns:
+        Dictionary of {unified_name: arkit_name}
+    """
+    return {v: k for k, v in ARKIT_TO_UNIFIED.items()}
 
 
 def get_image_files(directory):
@@ -94,14 +121,289 @@ def get_image_files(directory):
     if not directory or not os.path.exists(directory):
         return []
 
-    valid_extensions = {'.png', '.jpg', '.jpeg', '.bmp', '.tga', '.exr', '.hdr'}
-    image_files = []
+    # scandir entries carry their file type, so no extra stat per file
+    with os.scandir(os.path.abspath(directory)) as entries:
+        return [
+            entry.path for entry in entries
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS_TUPLE)
+        ]
+
+
+def resolve_output_dir(output_path):
+    """
+    Resolve the output path setting to an absolute directory
+
+    Expands Blender's relative path notation (//), environment variables
+    and ~. Results are cached per blend file location, since // depends
+    on it; the output path property clears the cache when edited.
+
+    Args:
+        output_path: Output path as entered in the panel
+
+    Returns:
+        Resolved output directory (Path)
+    """
+    return _resolve_output_dir(output_path, bpy.data.filepath)
+
+
+@lru_cache(maxsize=8)
+def _resolve_output_dir(output_path, blend_filepath):
+    """Resolve an output path relative to the given blend file location"""
+    # bpy.path.abspath handles Blender's // notation
+    output_path = bpy.path.abspath(output_path)
+    output_path = os.path.expanduser(os.path.expandvars(output_path))
+    return Path(output_path).resolve()
+
+
+def clear_output_dir_cache(self=None, context=None):
+    """
+    Forget cached output directory resolutions
+
+    Usable directly as a property update callback.
+    """
+    _resolve_output_dir.cache_clear()
+
+
+def get_shard_range(total_items, shard_index, shard_total):
+    """
+    Get the contiguous range of items handled by one shard
+
+    Args:
+        total_items: Number of items to split
+        shard_index: Index of the shard (0-based)
+        shard_total: Number of shards
+
+    Returns:
+        Tuple of (start, end) item indices, end exclusive
+    """
+    base, extra = divmod(total_items, shard_total)
+    start = shard_index * base + min(shard_index, extra)
+    end = start + base + (1 if shard_index < extra else 0)
+
+    return start, end
+
+
+def get_lock_path(output_dir, shard_index=None):
+    """
+    Get the path of the lock file of a render job
+
+    Args:
+        output_dir: Output directory path
+        shard_index: Shard rendered by a worker process, None for the main job
+
+    Returns:
+        Lock file path inside the output directory
+    """
+    lock_name = ".ccabn.lock" if shard_index is None else f".ccabn.lock.{shard_index}"
+    return os.path.join(str(output_dir), lock_name)
+
+
+def acquire_output_lock(output_dir, shard_index=None, start=0, end=0):
+    """
+    Create a lock file marking the output folder as in use by this process
+
+    The interactive job locks '.ccabn.lock' and every worker process locks
+    its own '.ccabn.lock.<shard>', so a second job can't write into a
+    folder that is still being rendered to.
+
+    Args:
+        output_dir: Output directory path
+        shard_index: Shard rendered by this process, None for the main job
+        start: First image index rendered by this process
+        end: Last image index rendered by this process (exclusive)
+
+    Returns:
+        Tuple of (lock_path, error_message), lock_path is None if the lock is taken
+    """
+    lock_path = get_lock_path(output_dir, shard_index)
+
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None, f"Output folder is in use by another render job. If no job is running, delete '{lock_path}'"
+    except OSError as e:
+        return None, f"Cannot create lock file '{lock_path}': {str(e)}"
+
+    with os.fdopen(fd, 'w') as f:
+        json.dump({"pid": os.getpid(), "shard": shard_index, "start": start, "end": end}, f)
+
+    # Don't leave the lock behind if Blender exits mid-render
+    atexit.register(release_output_lock, lock_path)
+
+    return lock_path, ""
+
+
+def release_output_lock(lock_path):
+    """
+    Remove a lock file created by acquire_output_lock
+
+    Args:
+        lock_path: Path returned by acquire_output_lock
+    """
+    atexit.unregister(release_output_lock)
+
+    try:
+        os.remove(lock_path)
+    except FileNotFoundError:
+        pass
+
+
+def release_worker_locks(output_dir, shard_total):
+    """
+    Remove the lock files of exited worker processes
+
+    Workers that are terminated don't get to remove their own lock, so the
+    process that launched them clears the locks once they have exited.
+
+    Args:
+        output_dir: Output directory path
+        shard_total: Number of worker processes
+    """
+    for shard_index in range(shard_total):
+        try:
+            os.remove(get_lock_path(output_dir, shard_index))
+        except FileNotFoundError:
+            pass
+
+
+def get_stop_path(output_dir):
+    """
+    Get the path of the file asking worker processes to stop
+
+    Workers check for it between images, so they can save their metadata
+    and exit instead of being terminated mid-render.
+
+    Args:
+        output_dir: Output directory path
+
+    Returns:
+        Stop file path inside the output directory
+    """
+    return os.path.join(str(output_dir), ".ccabn.stop")
+
+
+def get_metadata_filename(shard_index=None):
+    """
+    Get the name of the metadata file written by a render job
+
+    Args:
+        shard_index: Shard rendered by a worker process, None for the full dataset
+
+    Returns:
+        File name inside the output directory
+    """
+    if shard_index is None:
+        return METADATA_FILENAME
+
+    return f"metadata.{shard_index}.json"
+
+
+def write_metadata(metadata_path, metadata):
+    """
+    Write the metadata of all rendered images to one JSON file
+
+    The file is written next to the target and then moved into place, so
+    an interrupted write never leaves a truncated file behind.
 
-    for file in Path(directory).iterdir():
-        if file.is_file() and file.suffix.lower() in valid_extensions:
-            image_files.append(str(file.absolute()))
+    Args:
+        metadata_path: Path of the metadata file
+        metadata: List of per-image metadata dictionaries
+    """
+    temp_path = f"{metadata_path}.tmp"
+    if orjson is not None:
+        with open(temp_path, 'wb') as f:
+            f.write(orjson.dumps(metadata))
+    else:
+        with open(temp_path, 'w') as f:
+            json.dump(metadata, f)
+    os.replace(temp_path, metadata_path)
+
+
+def clear_metadata(output_dir):
+    """
+    Remove the metadata files of a previous job from the output folder
+
+    A new job overwrites the images of the previous one, so its metadata
+    would no longer match them if the new job stops early.
+
+    Args:
+        output_dir: Output directory path
+    """
+    with os.scandir(str(output_dir)) as entries:
+        for entry in entries:
+            name = entry.name
+            if name == METADATA_FILENAME or (name.startswith("metadata.") and name.endswith(".json")):
+                os.remove(entry.path)
+
+
+def merge_metadata(output_dir, shard_total):
+    """
+    Merge the metadata files written by worker processes
+
+    Shards cover contiguous image ranges, so joining them in shard order
+    keeps the images in order. Missing shards (e.g. a worker that failed
+    before its first image) are skipped, and an existing metadata file is
+    left alone when no shard wrote any.
+
+    Args:
+        output_dir: Output directory path
+        shard_total: Number of worker processes
+
+    Returns:
+        Number of images in the merged metadata file
+    """
+    metadata = []
+    shard_paths = []
+
+    for shard_index in range(shard_total):
+        shard_path = os.path.join(str(output_dir), get_metadata_filename(shard_index))
+        try:
+            with open(shard_path) as f:
+                metadata.extend(json.load(f))
+        except FileNotFoundError:
+            continue
+        shard_paths.append(shard_path)
+
+    if not shard_paths:
+        return 0
+
+    write_metadata(os.path.join(str(output_dir), METADATA_FILENAME), metadata)
 
-    return image_files
+    for shard_path in shard_paths:
+        os.remove(shard_path)
+
+    return len(metadata)
+
+
+def get_blendshape_selection(blendshape_list):
+    """
+    Read the selection flag of every blendshape in one call
+
+    Args:
+        blendshape_list: Blendshape list collection
+
+    Returns:
+        List of booleans, one per item
+    """
+    selected = [False] * len(blendshape_list)
+    blendshape_list.foreach_get("selected", selected)
+    return selected
+
+
+def get_selected_blendshape_names(props):
+    """
+    Get the names of the blendshapes selected for randomization
+
+    Args:
+        props: CCABN properties from scene
+
+    Returns:
+        Set of selected blendshape names
+    """
+    blendshape_list = props.blendshape_list
+    selected = get_blendshape_selection(blendshape_list)
+
+    return {name for name, is_selected in zip(blendshape_list.keys(), selected) if is_selected}
 
 
 def validate_scene_setup(props):
@@ -133,36 +435,36 @@ def validate_scene_setup(props):
     if props.headset_gray_min > props.headset_gray_max:
         return False, "Headset gray min cannot be greater than max"
 
+    # Check images per human
+    if props.images_per_human <= 0:
+        return False, "Images per human must be greater than 0"
+
+    # Check output path
+    if not props.output_path:
+        return False, "No output path specified"
+
     # Check selected blendshapes exist on all humans
-    selected_shapes = [item.name for item in props.blendshape_list if item.selected]
+    selected_shapes = get_selected_blendshape_names(props)
     if len(selected_shapes) == 0:
         return False, "No blendshapes selected for randomization"
 
-    for item in props.human_faces:
-        if not item.obj:
-            return False, "One or more human face references are invalid"
-
-        human_obj = item.obj
+    # Snapshot the face objects once
+    human_objs = [item.obj for item in props.human_faces]
+    if not all(human_objs):
+        return False, "One or more human face references are invalid"
 
+    for human_obj in human_objs:
         if not human_obj.data.shape_keys:
             return False, f"Object '{human_obj.name}' has no shape keys"
 
-        shape_key_names = [sk.name for sk in human_obj.data.shape_keys.key_blocks]
-        missing_shapes = [s for s in selected_shapes if s not in shape_key_names]
+        missing_shapes = selected_shapes.difference(human_obj.data.shape_keys.key_blocks.keys())
 
         if missing_shapes:
-            return False, f"Object '{human_obj.name}' is missing blendshapes: {', '.join(missing_shapes)}"
-
-    # Check output path
-    if not props.output_path:
-        return False, "No output path specified"
+            return False, f"Object '{human_obj.name}' is missing blendshapes: {', '.join(sorted(missing_shapes))}"
 
     # Expand Blender's relative path notation (//) and other paths
     try:
-        # bpy.path.abspath handles Blender's // notation
-        output_path = bpy.path.abspath(props.output_path)
-        output_path = os.path.expanduser(os.path.expandvars(output_path))
-        output_dir = Path(output_path).resolve()
+        output_dir = resolve_output_dir(props.output_path)
     except Exception as e:
         return False, f"Invalid output path '{props.output_path}': {str(e)}"
 
@@ -179,50 +481,112 @@ def validate_scene_setup(props):
     if not os.access(str(output_dir), os.W_OK):
         return False, f"Output directory is not writable: {output_dir}. Check permissions with: ls -la {output_dir.parent}"
 
-    # Check images per human
-    if props.images_per_human <= 0:
-        return False, "Images per human must be greater than 0"
-
     return True, ""
 
 
+def get_human_shape_keys(props):
+    """
+    Read the shape key names of every selected human face
+
+    Args:
+        props: CCABN properties from scene
+
+    Returns:
+        List of (object pointer, tuple of shape key names), one per valid face
+    """
+    human_shape_keys = []
+    for human_obj in [item.obj for item in props.human_faces]:
+        if not human_obj:
+            continue
+
+        shape_keys = human_obj.data.shape_keys
+        names = tuple(shape_keys.key_blocks.keys()) if shape_keys else ()
+        human_shape_keys.append((human_obj.as_pointer(), names))
+
+    return human_shape_keys
+
+
+def get_blendshape_fingerprint(human_shape_keys):
+    """
+    Fingerprint the shape keys available on the selected human faces
+
+    Args:
+        human_shape_keys: Result of get_human_shape_keys
+
+    Returns:
+        Non-negative 31-bit hash of the object pointers and shape key names,
+        small enough to store as an ID property
+    """
+    return hash(tuple(human_shape_keys)) & 0x7FFFFFFF
+
+
 def refresh_blendshape_list(context):
     """
     Refresh the blendshape list based on selected human faces
 
+    Skips the refresh when the faces and their shape keys are unchanged
+    since the last refresh. The fingerprint is stored on the scene
+    properties, so each scene tracks its own list. Shapes that stay in
+    the list keep their selection and range, and the list is left as is
+    when the shape names did not change.
+
     Args:
         context: Blender context
+
+    Returns:
+        True if the faces were read again, False if they are unchanged
+        since the last refresh
     """
     props = context.scene.ccabn_props
 
-    # Clear existing list
-    props.blendshape_list.clear()
+    # Read the faces once, for both the fingerprint and the list
+    human_shape_keys = get_human_shape_keys(props)
 
-    # If no humans selected, return
-    if len(props.human_faces) == 0:
-        return
+    fingerprint = get_blendshape_fingerprint(human_shape_keys)
+    if fingerprint == props.get("_last_refresh_fp"):
+        return False
+    props["_last_refresh_fp"] = fingerprint
 
     # Collect all unique shape keys from selected humans
     all_shape_keys = set()
-    for item in props.human_faces:
-        if not item.obj:
-            continue
+    for _, names in human_shape_keys:
+        all_shape_keys.update(names)
+
+    # Skip the basis shape
+    all_shape_keys.discard("Basis")
+    new_names = sorted(all_shape_keys)
+
+    # Ranges saved by older versions are still stored as min_value and
+    # max_value ID properties, move them into range_values
+    for item in props.blendshape_list:
+        legacy_range = (item.get("min_value"), item.get("max_value"))
+        if legacy_range != (None, None):
+            item.range_values = (
+                0.0 if legacy_range[0] is None else legacy_range[0],
+                1.0 if legacy_range[1] is None else legacy_range[1],
+            )
+            for key in ("min_value", "max_value"):
+                if key in item:
+                    del item[key]
+
+    # Keep the user's selection and ranges for shapes that stay in the list
+    old_states = {
+        item.name: (item.selected, tuple(item.range_values))
+        for item in props.blendshape_list
+    }
+    if list(old_states) == new_names:
+        return True
 
-        human_obj = item.obj
-
-        if human_obj.data.shape_keys:
-            for shape_key in human_obj.data.shape_keys.key_blocks:
-                # Skip the basis shape
-                if shape_key.name != "Basis":
-                    all_shape_keys.add(shape_key.name)
+    props.blendshape_list.clear()
 
-    # Add to list
-    for shape_name in sorted(all_shape_keys):
+    for shape_name in new_names:
+        selected, range_values = old_states.get(shape_name, (False, (0.0, 1.0)))
         item = props.blendshape_list.add()
         item.name = shape_name
-        item.selected = False
-        item.min_value = 0.0
-        item.max_value = 1.0
+        item.selected = selected
+        item.range_values = range_values
+
+    return True
 
 
 def convert_blendshapes_arkit_to_unified(obj):
@@ -240,11 +604,17 @@ def convert_blendshapes_arkit_to_unified(obj):
 
     renamed = []
 
-    for shape_key in obj.data.shape_keys.key_blocks:
-        if shape_key.name in ARKIT_TO_UNIFIED:
-            old_name = shape_key.name
+    # Read all names at once and only touch the key blocks that match
+    key_blocks = obj.data.shape_keys.key_blocks
+    names = key_blocks.keys()
+    matched = ARKIT_KEYS.intersection(names)
+    if not matched:
+        return 0, []
+
+    for index, old_name in enumerate(names):
+        if old_name in matched:
             new_name = ARKIT_TO_UNIFIED[old_name]
-            shape_key.name = new_name
+            key_blocks[index].name = new_name
             renamed.append((old_name, new_name))
 
     return len(renamed), renamed